@@ -0,0 +1,93 @@
+'''Content-addressed cache of compilation outputs (IR, optimized IR and binaries).'''
+import hashlib
+import os
+from pathlib import Path
+import shutil
+import tempfile
+
+DEFAULT_CACHE_DIR = Path(os.environ.get('BASIC_COMPILER_CACHE_DIR', Path.home() / '.cache' / 'basic_compiler'))
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+# Subdirectory of the cache with the tokens kept by the incremental pipeline, one file per program
+TOKEN_CACHE_DIR = '.tokens'
+
+_compiler_hash = None
+
+
+def compiler_hash():
+    '''Hash of the compiler sources, so that changes to the compiler invalidate cached outputs.'''
+    global _compiler_hash
+    if _compiler_hash is None:
+        h = hashlib.sha256()
+        package_dir = Path(__file__).resolve().parent
+        for path in sorted(package_dir.rglob('*.py')):
+            h.update(str(path.relative_to(package_dir)).encode())
+            h.update(path.read_bytes())
+        _compiler_hash = h.hexdigest()
+    return _compiler_hash
+
+
+def cache_key(source, flags):
+    h = hashlib.sha256()
+    h.update(compiler_hash().encode())
+    h.update(repr(sorted(flags.items())).encode())
+    h.update(Path(source).read_bytes())
+    return h.hexdigest()
+
+
+def entry_size(entry):
+    return sum(x.stat().st_size for x in entry.iterdir())
+
+
+class CompilationCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    def restore(self, key, artifacts):
+        '''Copy cached artifacts (a dict of artifact name -> destination path) out of the cache.
+
+        Returns False if any of them isn't cached.'''
+        entry = self.directory / key
+        if not all((entry / x).is_file() for x in artifacts):
+            return False
+        for name, destination in artifacts.items():
+            shutil.copy2(entry / name, destination)
+        # Mark as recently used for LRU eviction
+        os.utime(entry)
+        return True
+
+    def store(self, key, artifacts):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = self.directory / key
+        # Build the entry in a temporary directory and rename it, so readers never see partial entries
+        staging = Path(tempfile.mkdtemp(dir=self.directory, prefix='.tmp-'))
+        try:
+            for name, path in artifacts.items():
+                shutil.copy2(path, staging / name)
+            if entry.exists():
+                shutil.rmtree(entry)
+            staging.rename(entry)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.evict()
+
+    def evict(self):
+        '''Remove least recently used entries and token files until the cache fits in max_size bytes.'''
+        if not self.directory.is_dir():
+            return
+        entries = [x for x in self.directory.iterdir() if x.is_dir() and not x.name.startswith('.')]
+        token_dir = self.directory / TOKEN_CACHE_DIR
+        if token_dir.is_dir():
+            entries.extend(x for x in token_dir.iterdir() if x.is_file() and not x.name.startswith('.'))
+        entries.sort(key=lambda x: x.stat().st_mtime)
+        sizes = {x: entry_size(x) if x.is_dir() else x.stat().st_size for x in entries}
+        total_size = sum(sizes.values())
+        for entry in entries:
+            if total_size <= self.max_size:
+                break
+            if entry.is_dir():
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                entry.unlink(missing_ok=True)
+            total_size -= sizes[entry]
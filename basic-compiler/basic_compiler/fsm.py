@@ -2,6 +2,9 @@ from collections import namedtuple
 
 State = namedtuple('State', ['accept', 'transitions'], defaults=(None, []))
 Transition = namedtuple('Transition', ['event', 'to', 'semantic_action'], defaults=([], None))
+# Precompiled form of a State's transition list. Lookups try by_value, then by_class, then fallback, which gives the same
+# result as scanning the transition list in order
+DispatchTable = namedtuple('DispatchTable', ['by_value', 'by_class', 'fallback'])
 
 
 class FsmError(RuntimeError):
@@ -15,6 +18,49 @@ def find_transition(transition_list, event):
                  if not x.event or isinstance(x.event, Fsm) or x.event == case_insensitive_event or isinstance(x.event, str) and x.event == event[0]), None)
 
 
+def compile_state(state):
+    by_value = {}
+    by_class = {}
+    fallback = None
+    for transition in state.transitions:
+        event = transition.event
+        if not event or isinstance(event, Fsm):
+            # Empty transitions and sub-FSM calls match any event, so later transitions are unreachable
+            fallback = transition
+            break
+        if isinstance(event, str):
+            by_class.setdefault(event, transition)
+        elif event[0] not in by_class:
+            # A (class, value) transition listed after a transition on the whole class is unreachable
+            by_value.setdefault(event, transition)
+    return DispatchTable(by_value, by_class, fallback)
+
+
+def compile_states(states):
+    return {name: compile_state(state) for name, state in states.items()}
+
+
+def find_compiled_transition(dispatch_table, event):
+    event_class, value = event
+    if isinstance(value, str):
+        # Comparisons of the token value are case insensitive
+        transition = dispatch_table.by_value.get((event_class, value.upper()))
+        if transition is not None:
+            return transition
+    return dispatch_table.by_class.get(event_class, dispatch_table.fallback)
+
+
+def bind_actions(target, names):
+    '''Semantic actions by name, which are attribute paths of target (print.string is target.print.string).'''
+    actions = {}
+    for name in names:
+        action = target
+        for attribute in name.split('.'):
+            action = getattr(action, attribute)
+        actions[name] = action
+    return actions
+
+
 def call_semantic_action(f, event):
     if not f:
         return
@@ -24,52 +70,97 @@ def call_semantic_action(f, event):
         f()
 
 
+class Frame:
+    '''Call of a sub-FSM: the state it's in, and the semantic action called when it succeeds.'''
+    __slots__ = ('fsm', 'state_name', 'on_success')
+
+    def __init__(self):
+        self.fsm = None
+        self.state_name = None
+        self.on_success = None
+
+
 class Fsm:
-    def __init__(self, states):
-        self.states = states
-        self.sub_fsm = None
+    def __init__(self, states, dispatch_tables=None, actions=None):
+        self._states = states
+        self.dispatch_tables = dispatch_tables if dispatch_tables is not None else compile_states(states)
+        # Semantic actions of transitions naming them instead of calling a function. Sub-FSMs use the actions of the
+        # FSM calling them, so states and dispatch tables can be shared by FSMs with different actions
+        self.actions = actions or {}
         self.on_success = None
+        # Stack of sub-FSM calls. Frames are reused, so calling a sub-FSM doesn't allocate after the deepest nesting
+        # was seen once
+        self.frames = []
+        self.depth = 0
         self.reset()
 
+    @property
+    def states(self):
+        return self._states
+
+    @states.setter
+    def states(self, states):
+        self._states = states
+        self.dispatch_tables = compile_states(states)
+
     def reset(self):
         self.current_state_name = 'start'
         self.current_token = []
+        self.depth = 0
 
-    def copy(self):
-        return Fsm(self.states)
+    def call(self, fsm, on_success):
+        if self.depth == len(self.frames):
+            self.frames.append(Frame())
+        frame = self.frames[self.depth]
+        frame.fsm = fsm
+        frame.state_name = 'start'
+        frame.on_success = on_success
+        self.depth += 1
 
     def transition(self, event):
-        if self.sub_fsm:
-            result = self.sub_fsm.transition(event)
-            if not result:
-                return
-            # Sub FSM succeeded, go back to normal execution
-            self.sub_fsm = None
-            return self.transition(event)
-        current_state = self.states[self.current_state_name]
-        next_transition = find_transition(current_state.transitions, event)
-        identified_token = None
-        if next_transition is None:
-            # Longest path found
-            if not current_state.accept:
-                raise FsmError('No valid transition for {}'.format(event))
-            # Return token class and value
-            identified_token = (current_state.accept, ''.join(self.current_token))
-            if self.on_success is None:
-                self.reset()
-                self.transition(event)
+        actions = self.actions
+        while True:
+            if self.depth:
+                # Run the innermost sub-FSM
+                frame = self.frames[self.depth - 1]
+                fsm = frame.fsm
+                state_name = frame.state_name
+            else:
+                frame = None
+                fsm = self
+                state_name = self.current_state_name
+            next_transition = find_compiled_transition(fsm.dispatch_tables[state_name], event)
+            if next_transition is None:
+                current_state = fsm._states[state_name]
+                # Longest path found
+                if not current_state.accept:
+                    raise FsmError('No valid transition for {}'.format(event))
+                if frame:
+                    # Sub-FSM succeeded, go back to the calling FSM, which receives the same event
+                    self.depth -= 1
+                    call_semantic_action(actions.get(frame.on_success, frame.on_success), event)
+                    continue
+                # Return token class and value
+                identified_token = (current_state.accept, ''.join(self.current_token))
+                if self.on_success is None:
+                    self.reset()
+                    self.transition(event)
+                else:
+                    call_semantic_action(self.on_success, event)
+                return identified_token
+            if frame:
+                frame.state_name = next_transition.to
             else:
-                call_semantic_action(self.on_success, event)
-            return identified_token
-        self.current_state_name = next_transition.to
-        if isinstance(next_transition.event, Fsm):
-            # Call a sub-FSM
-            self.sub_fsm = next_transition.event.copy()
-            self.sub_fsm.on_success = next_transition.semantic_action or False
-            return self.transition(event)
-        if next_transition.semantic_action:
-            call_semantic_action(next_transition.semantic_action, event)
-        if not next_transition.event:
-            # Empty transition, don't consume the token yet
-            return self.transition(event)
-        self.current_token.append(event[1])
+                self.current_state_name = next_transition.to
+            if isinstance(next_transition.event, Fsm):
+                self.call(next_transition.event, next_transition.semantic_action)
+                continue
+            semantic_action = next_transition.semantic_action
+            if semantic_action:
+                call_semantic_action(actions.get(semantic_action, semantic_action), event)
+            if not next_transition.event:
+                # Empty transition, don't consume the token yet
+                continue
+            if not frame:
+                self.current_token.append(event[1])
+            return
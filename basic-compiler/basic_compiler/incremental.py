@@ -0,0 +1,140 @@
+'''Incremental compilation, keeping the tokens of each numbered line between compilations of a program.
+
+Only lines that changed since the previous compilation are tokenized again. Code is still generated for the whole
+program from the tokens, since the code of a line depends on the lines before it (register and string constant numbering,
+open FOR loops, DATA positions and variables promoted to registers).'''
+import hashlib
+import os
+from pathlib import Path
+import pickle
+import re
+import sys
+import tempfile
+
+from basic_compiler.cache import compiler_hash, DEFAULT_CACHE_DIR, TOKEN_CACHE_DIR
+from basic_compiler.modules.EventEngine import print_report
+from basic_compiler.modules.semantic.options import CodegenOptions
+from basic_compiler.modules.syntax_recognizer.SyntaxRecognizer import SyntaxRecognizer
+
+DEFAULT_TOKEN_CACHE_DIR = DEFAULT_CACHE_DIR / TOKEN_CACHE_DIR
+
+LINE_NUMBER = re.compile(r'\s*(\d+)')
+
+
+def line_number(line):
+    '''Number of a BASIC line, or None for lines without one (which are always tokenized).'''
+    match = LINE_NUMBER.match(line)
+    return match and match.group(1)
+
+
+def tokenize(modules, lines):
+    '''Tokens of each line, split after the end of line tokens. modules are the lexer modules, connected in order.'''
+    tokens = []
+    for source, sink in zip(modules, modules[1:]):
+        source.set_external_event_handler(sink.handle_event)
+    modules[-1].set_external_event_handler(tokens.append)
+    try:
+        for line in lines:
+            modules[0].handle_event(('ascii_line', line))
+        modules[-1].handle_event(('eof', None))
+    except:
+        print_report(modules)
+        raise
+
+    line_tokens = [[]]
+    for token in tokens:
+        if token[0] == 'eof':
+            break
+        line_tokens[-1].append(token)
+        if token[0] == 'end_of_line':
+            line_tokens.append([])
+    if not line_tokens[-1]:
+        line_tokens.pop()
+    assert len(line_tokens) == len(lines), 'Tokens of {} lines found in {} lines'.format(len(line_tokens), len(lines))
+    return line_tokens
+
+
+class TokenCache:
+    '''Tokens of the numbered lines of a program, stored in a file between compilations (unless path is None).'''
+    def __init__(self, path=None):
+        self.path = path and Path(path)
+        # Line number -> (line, tokens)
+        self.lines = {}
+        self.tokenized_lines = 0
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                version, lines = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return
+        # Tokens found by another version of the compiler are discarded
+        if version == compiler_hash():
+            self.lines = lines
+
+    @classmethod
+    def for_source(cls, source, directory=DEFAULT_TOKEN_CACHE_DIR):
+        name = hashlib.sha256(str(Path(source).resolve()).encode()).hexdigest()
+        return cls(Path(directory) / name)
+
+    def tokens(self, lines, lexer):
+        '''Tokens of each line, tokenizing only the lines that aren't cached. lexer returns new lexer modules.'''
+        numbers = [line_number(x) for x in lines]
+        line_tokens = [None] * len(lines)
+        changed = []
+        for i, (line, number) in enumerate(zip(lines, numbers)):
+            cached = self.lines.get(number)
+            if cached and cached[0] == line:
+                line_tokens[i] = cached[1]
+            else:
+                changed.append(i)
+        if changed:
+            for i, tokens in zip(changed, tokenize(lexer(), [lines[x] for x in changed])):
+                line_tokens[i] = tokens
+        self.tokenized_lines = len(changed)
+        self.lines = {number: (line, tokens) for line, number, tokens in zip(lines, numbers, line_tokens) if number}
+        return line_tokens
+
+    def save(self):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file and rename it, so concurrent compilations never read partial files
+        fd, temporary = tempfile.mkstemp(dir=self.path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((compiler_hash(), self.lines), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self.path)
+        except OSError:
+            os.unlink(temporary)
+            raise
+
+
+def to_ir(filename, lexer, output=None, options=CodegenOptions(), directory=DEFAULT_TOKEN_CACHE_DIR):
+    '''Write the IR of filename to output, using the tokens cached in directory. lexer returns new lexer modules.
+
+    If directory is None, all lines are tokenized and no tokens are stored.'''
+    try:
+        with open(filename) as f:
+            lines = f.readlines()
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        raise SystemExit(1)
+    cache = TokenCache.for_source(filename, directory) if directory else TokenCache()
+    line_tokens = cache.tokens(lines, lexer)
+
+    recognizer = SyntaxRecognizer(output=output, options=options)
+    line_count, line = 0, ''
+    try:
+        recognizer.handle_event(('open', filename))
+        for line_count, (line, tokens) in enumerate(zip(lines, line_tokens), 1):
+            recognizer.handle_events(tokens)
+        recognizer.handle_event(('eof', None))
+    except:
+        print('Line {}: {}'.format(line_count, line), file=sys.stderr)
+        raise
+    # Tokens are only kept for programs that compile
+    try:
+        cache.save()
+    except OSError as e:
+        print('Failed to store tokens in cache: {}'.format(e), file=sys.stderr)
@@ -1,58 +1,308 @@
 import argparse
-from contextlib import redirect_stdout
+from concurrent.futures import as_completed, ProcessPoolExecutor, ThreadPoolExecutor
+import glob
 import io
+import os
 from pathlib import Path
 import subprocess
+import sys
+import time
 
-from basic_compiler.modules.EventEngine import EventEngine
+from basic_compiler import incremental, toolchain
+from basic_compiler.cache import cache_key, CompilationCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE, TOKEN_CACHE_DIR
+from basic_compiler.modules.EventEngine import EventEngine, print_report
+from basic_compiler.modules.semantic.options import CodegenOptions, EXPRESSION_ENGINES
 from basic_compiler.modules.syntax_recognizer.SyntaxRecognizer import SyntaxRecognizer
 from basic_compiler.modules.tokenization.AsciiCategorizer import AsciiCategorizer
+from basic_compiler.modules.tokenization.DfaTokenizer import DfaTokenizer
 from basic_compiler.modules.tokenization.FileReader import FileReader
+from basic_compiler.modules.tokenization.RegexTokenizer import RegexTokenizer
 from basic_compiler.modules.tokenization.Tokenizer import Tokenizer
 
 
-def parse_args():
+LEXERS = {
+    'fsm': lambda: [AsciiCategorizer(), Tokenizer()],
+    'dfa': lambda: [DfaTokenizer()],
+    'regex': lambda: [RegexTokenizer()],
+}
+
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description='BASIC to LLVM IR compiler.')
     parser.add_argument('--opt', action='store_true', help='call optimizer on generated code')
     parser.add_argument('--lli', action='store_true', help='run generated code with lli')
-    parser.add_argument('--bin', help='call assembler and linker to output a binary')
-    parser.add_argument('source', type=Path, help='source file')
-    return parser.parse_args()
+    parser.add_argument('--save-temps', action='store_true',
+                        help='write intermediate .ll files when outputting a binary or running lli')
+    parser.add_argument('--bin', help='call assembler and linker to output a binary (a directory of binaries when '
+                                      'compiling multiple sources)')
+    parser.add_argument('--promote-variables', action='store_true',
+                        help='keep scalar variables in registers across lines of a basic block')
+    parser.add_argument('--integer-indices', action='store_true',
+                        help='index arrays with integer FOR counters directly')
+    parser.add_argument('--heap-array-threshold', type=int, metavar='BYTES',
+                        help='allocate arrays larger than BYTES on the heap when the program starts')
+    parser.add_argument('--buffered-print', action='store_true',
+                        help='buffer PRINT output in the program, instead of calling printf for each statement')
+    parser.add_argument('--gosub-return-stack', action='store_true',
+                        help='compile GOSUB and RETURN to branches with an explicit return stack, instead of recursive '
+                             'calls')
+    parser.add_argument('--inline-functions', action='store_true',
+                        help='inline small DEF FN functions at call sites')
+    parser.add_argument('--expression-engine', choices=EXPRESSION_ENGINES, default='queue',
+                        help='how expressions are compiled: while they are recognized, or after parsing them to a tree')
+    parser.add_argument('--lexer', choices=LEXERS, default='fsm', help='lexical analyzer implementation')
+    parser.add_argument('--pipeline', choices=PIPELINES, default='events', help='how compiler modules are connected')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(),
+                        help='parallel jobs when compiling multiple sources')
+    parser.add_argument('--no-cache', action='store_true', help="don't use cached compilation outputs")
+    parser.add_argument('--cache-dir', type=Path, default=DEFAULT_CACHE_DIR, help='compilation cache directory')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // 2 ** 20,
+                        help='maximum compilation cache size, in MiB')
+    parser.add_argument('sources', nargs='+', help='source files, directories or glob patterns')
+    return parser.parse_args(argv)
+
 
+def codegen_options(args):
+    return CodegenOptions(promote_variables=args.promote_variables, integer_indices=args.integer_indices,
+                          heap_array_threshold=args.heap_array_threshold, buffered_print=args.buffered_print,
+                          gosub_return_stack=args.gosub_return_stack, inline_functions=args.inline_functions,
+                          expression_engine=args.expression_engine)
 
-def to_ir(filename):
+
+def to_ir(filename, lexer='fsm', output=None, options=CodegenOptions()):
     engine = EventEngine([
         FileReader(),
-        AsciiCategorizer(),
-        Tokenizer(),
-        SyntaxRecognizer(),
-    ])
+        *LEXERS[lexer](),
+        SyntaxRecognizer(output=output, options=options),
+    ], batched=True)
     engine.start(('open', filename))
 
 
-def main(args):
-    if not args.source.exists():
-        raise RuntimeError('{} not found'.format(args.source))
+def to_ir_streaming(filename, lexer='fsm', output=None, options=CodegenOptions()):
+    modules = [
+        FileReader(),
+        *LEXERS[lexer](),
+        SyntaxRecognizer(output=output, options=options),
+    ]
+    # Chain modules as generators (lines -> characters -> tokens -> semantic actions)
+    events = iter([('open', filename)])
+    for module in modules:
+        events = module.stream(events)
+    try:
+        for _ in events:
+            pass
+    except:
+        print_report(modules)
+        raise
+
+
+def to_ir_incremental(filename, lexer='fsm', output=None, options=CodegenOptions(),
+                      token_dir=incremental.DEFAULT_TOKEN_CACHE_DIR):
+    incremental.to_ir(filename, LEXERS[lexer], output, options, token_dir)
+
+
+PIPELINES = {
+    'events': to_ir,
+    'stream': to_ir_streaming,
+    'incremental': to_ir_incremental,
+}
+
 
+def pipeline_options(args):
+    '''Keyword arguments of the pipeline selected in args.'''
+    if args.pipeline != 'incremental':
+        return {}
+    # Tokens are kept in the cache directory, where they are evicted along with compilation outputs
+    return {'token_dir': None if args.no_cache else args.cache_dir / TOKEN_CACHE_DIR}
+
+
+def compile_to_ir(source, lexer='fsm', pipeline='events', options=CodegenOptions(), **pipeline_options):
     with io.StringIO() as f:
-        with redirect_stdout(f):
-            to_ir(args.source)
-        s = f.getvalue()
+        PIPELINES[pipeline](source, lexer, f, options, **pipeline_options)
+        return f.getvalue()
+
+
+def generate_ir(source, artifacts, lexer='fsm', pipeline='events', options=CodegenOptions(), **pipeline_options):
+    '''Stream the IR of source to its .ll file if it's materialised, or return it as a string otherwise.'''
+    if 'ir.ll' not in artifacts:
+        return compile_to_ir(source, lexer, pipeline, options, **pipeline_options)
+    # Failed compilations must not leave partial IR, or overwrite the IR of an earlier compilation
+    path = Path(artifacts['ir.ll'])
+    temporary = path.with_name('.{}.{}.tmp'.format(path.name, os.getpid()))
+    try:
+        with open(temporary, 'w') as f:
+            PIPELINES[pipeline](source, lexer, f, options, **pipeline_options)
+        os.replace(temporary, path)
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
+
+
+def timed_generate_ir(*args, **kwargs):
+    start = time.perf_counter()
+    ir = generate_ir(*args, **kwargs)
+    return ir, time.perf_counter() - start
+
+
+def artifact_paths(source, opt=False, binary=None, keep_ir=True):
+    '''Files materialised when compiling source, by their name in the compilation cache.'''
+    artifacts = {}
+    if keep_ir:
+        artifacts['ir.ll'] = source.parent / '{}.ll'.format(source.stem)
+        if opt:
+            artifacts['opt.ll'] = source.parent / '{}_Ofast.ll'.format(source.stem)
+    if binary:
+        artifacts['bin'] = Path(binary)
+    return artifacts
+
+
+def ir_writer(path, ir):
+    return toolchain.file_writer(path) if ir is None else toolchain.text_writer(ir)
 
-    output = args.source.parent / '{}.ll'.format(args.source.stem)
-    with open(output, 'w') as f:
-        f.write(s)
 
-    if args.opt:
-        output_optimized = args.source.parent / '{}_Ofast.ll'.format(args.source.stem)
-        subprocess.run(['clang', '-Ofast', '-S', '-emit-llvm', output, '-o', output_optimized], check=True)
-        output = output_optimized
+def run_toolchain(artifacts, ir, opt=False, lli=False):
+    '''Call clang on IR (or on the .ll file if ir is None), materialising only the files in artifacts.
+
+    Returns a writer of the program to be run by lli.'''
+    write_ir = ir_writer(artifacts.get('ir.ll'), ir)
+    program = write_ir
+    if opt and ('opt.ll' in artifacts or lli):
+        program = ir_writer(artifacts.get('opt.ll'), toolchain.optimize(write_ir, artifacts.get('opt.ll')))
+
+    if 'bin' in artifacts:
+        toolchain.link(write_ir, artifacts['bin'])
+    return program
+
+
+def timed_run_toolchain(*args):
+    start = time.perf_counter()
+    run_toolchain(*args)
+    return time.perf_counter() - start
+
+
+def compilation_flags(args):
+    '''Options that change compilation outputs, which are part of the cache key.'''
+    return {'opt': args.opt, 'bin': bool(args.bin), **codegen_options(args)._asdict()}
+
+
+def get_cache(args):
+    if args.no_cache:
+        return None
+    return CompilationCache(args.cache_dir, args.cache_size * 2 ** 20)
+
+
+def store_in_cache(cache, key, artifacts):
+    try:
+        cache.store(key, artifacts)
+    except OSError as e:
+        print('Failed to store compilation outputs in cache: {}'.format(e), file=sys.stderr)
+
+
+def expand_sources(patterns):
+    '''Expand directories (searched recursively for .bas files) and glob patterns to a sorted list of sources.'''
+    sources = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            sources.update(path.rglob('*.bas'))
+        elif path.exists():
+            sources.add(path)
+        else:
+            matches = [Path(x) for x in glob.glob(pattern, recursive=True)]
+            if not matches:
+                raise RuntimeError('{} not found'.format(pattern))
+            sources.update(x for x in matches if x.is_file())
+    return sorted(sources)
+
+
+def binary_paths(sources, directory):
+    '''Paths of the binaries of sources in directory, mirroring the layout of the sources below their common parent.
+
+    Sources with the same name in different directories get distinct binaries.'''
+    root = Path(os.path.commonpath([x.resolve().parent for x in sources]))
+    return {x: Path(directory) / x.resolve().relative_to(root).with_suffix('') for x in sources}
+
+
+def compile_batch(sources, args):
+    '''Compile sources to IR in a process pool, then run the toolchain for each of them in a bounded thread pool.
+
+    The toolchain of a source starts as soon as its IR is ready. Returns the number of failed sources.'''
+    binaries = binary_paths(sources, args.bin) if args.bin else {}
+    for path in set(x.parent for x in binaries.values()):
+        path.mkdir(parents=True, exist_ok=True)
+    cache = get_cache(args)
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as ir_executor, \
+            ThreadPoolExecutor(max_workers=args.jobs) as toolchain_executor:
+        ir_futures = {}
+        artifacts = {}
+        keys = {}
+        for source in sources:
+            artifacts[source] = artifact_paths(source, args.opt, binaries.get(source),
+                                               keep_ir=args.save_temps or not args.bin)
+            if cache:
+                keys[source] = cache_key(source, compilation_flags(args))
+                if cache.restore(keys[source], artifacts[source]):
+                    print('{}: cached'.format(source))
+                    continue
+            ir_futures[ir_executor.submit(timed_generate_ir, source, artifacts[source], args.lexer, args.pipeline,
+                                          codegen_options(args), **pipeline_options(args))] = source
+        toolchain_futures = {}
+        ir_times = {}
+        for future in as_completed(ir_futures):
+            source = ir_futures[future]
+            try:
+                ir, ir_times[source] = future.result()
+            except (Exception, SystemExit) as e:
+                failures += 1
+                print('{}: failed to generate IR ({}: {})'.format(source, type(e).__name__, e))
+                continue
+            toolchain_futures[toolchain_executor.submit(timed_run_toolchain, artifacts[source], ir, args.opt)] = source
+        for future in as_completed(toolchain_futures):
+            source = toolchain_futures[future]
+            try:
+                toolchain_time = future.result()
+            except (subprocess.CalledProcessError, OSError) as e:
+                failures += 1
+                print('{}: toolchain failed ({})'.format(source, e))
+                continue
+            if cache:
+                store_in_cache(cache, keys[source], artifacts[source])
+            print('{}: IR {:.3f}s, toolchain {:.3f}s'.format(source, ir_times[source], toolchain_time))
+    print('{} compiled, {} failed'.format(len(sources) - failures, failures))
+    return failures
+
+
+def main(args):
+    sources = expand_sources(args.sources)
+    if len(sources) > 1 or any(not Path(x).is_file() for x in args.sources):
+        if args.lli:
+            raise RuntimeError('--lli is not supported when compiling multiple sources')
+        if compile_batch(sources, args):
+            raise SystemExit(1)
+        return
 
-    if args.bin:
-        subprocess.run(['clang', '-Ofast', output, '-o', args.bin, '-lm'], check=True)
+    source = sources[0]
+    # Intermediate IR files are only written when they are the requested output or with --save-temps
+    keep_ir = args.save_temps or not (args.bin or args.lli)
+    artifacts = artifact_paths(source, args.opt, args.bin, keep_ir)
+    cache = get_cache(args)
+    # lli needs the IR, so outputs can only be cached with lli if IR files are materialised
+    cache_outputs = cache and (keep_ir or not args.lli)
+    key = cache_outputs and cache_key(source, compilation_flags(args))
+    if cache_outputs and cache.restore(key, artifacts):
+        program = args.lli and toolchain.file_writer(artifacts.get('opt.ll', artifacts['ir.ll']))
+    else:
+        ir = generate_ir(source, artifacts, args.lexer, args.pipeline, codegen_options(args), **pipeline_options(args))
+        program = run_toolchain(artifacts, ir, args.opt, args.lli)
+        if cache_outputs:
+            store_in_cache(cache, key, artifacts)
+        elif cache and args.pipeline == 'incremental':
+            # Storing outputs evicts old entries, this keeps the tokens of the incremental pipeline bounded otherwise
+            cache.evict()
 
     if args.lli:
-        subprocess.run(['lli', output], check=True)
+        toolchain.lli(program)
 
 if __name__ == '__main__':
     main(parse_args())
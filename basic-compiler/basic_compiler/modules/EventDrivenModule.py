@@ -4,23 +4,62 @@ from collections import deque
 class EventDrivenModule:
     def __init__(self, add_external_event=None):
         self.add_external_event = add_external_event
+        self.add_external_events = None
         self.handlers = self.get_handlers()
         self.queue = deque()
 
     def set_external_event_handler(self, add_external_event):
         self.add_external_event = add_external_event
 
+    def set_external_events_handler(self, add_external_events):
+        # Optional handler receiving a list of events at once, used by batched EventEngines
+        self.add_external_events = add_external_events
+
     def get_handlers(self):
         raise NotImplementedError()
 
     def add_event(self, event):
         self.queue.append(event)
 
+    def emit_events(self, events):
+        if self.add_external_events:
+            self.add_external_events(events)
+        else:
+            for event in events:
+                self.add_external_event(event)
+
     def handle_event(self, event):
         handler = self.handlers.get(event[0])
         assert handler, 'No handler defined for {}'.format(event[0])
         handler(event[1:])
 
+    def handle_events(self, events):
+        handlers = self.handlers
+        for event in events:
+            handlers[event[0]](event[1:])
+
+    def stream(self, events):
+        '''Generator handling events from an iterable and yielding the generated events.
+
+        Events without a handler in this module are forwarded. 'eof' is forwarded after being handled, so every stage of
+        a pipeline sees the end of the input.'''
+        generated_events = []
+        add_external_event, add_external_events = self.add_external_event, self.add_external_events
+        self.add_external_event, self.add_external_events = generated_events.append, generated_events.extend
+        try:
+            handlers = self.handlers
+            for event in events:
+                handler = handlers.get(event[0])
+                if handler:
+                    handler(event[1:])
+                    yield from generated_events
+                    generated_events.clear()
+                    if event[0] != 'eof':
+                        continue
+                yield event
+        finally:
+            self.add_external_event, self.add_external_events = add_external_event, add_external_events
+
     def __iter__(self):
         return self
 
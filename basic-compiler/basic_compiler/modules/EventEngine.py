@@ -1,23 +1,55 @@
 from collections import deque
+import sys
+
+
+def print_report(modules):
+    report = '\n'.join('{}: {}'.format(type(x).__name__, x.report()) for x in modules if getattr(x, 'report', None))
+    print(report, file=sys.stderr)
 
 
 class EventEngine:
-    def __init__(self, modules):
+    def __init__(self, modules, batched=False):
         self.modules = modules
+        routes = {}
         for module in modules:
             module.set_external_event_handler(self.add_event)
+            if batched:
+                module.set_external_events_handler(self.add_events)
+            for event_name in module.handlers:
+                routes.setdefault(event_name, []).append(module)
+        # Route each event name to the modules handling it. Equal routes share the same tuple, so batches can be split
+        # with identity comparisons
+        unique_routes = {}
+        self.routes = {k: unique_routes.setdefault(tuple(v), tuple(v)) for k, v in routes.items()}
+        self.handlers = {k: tuple(x.handlers[k] for x in v) for k, v in self.routes.items()}
         self.queue = deque()
 
     def add_event(self, event):
-        for module in self.modules:
-            if event[0] in module.handlers:
-                module.handle_event(event)
+        for handler in self.handlers.get(event[0], ()):
+            handler(event[1:])
+
+    def add_events(self, events):
+        # Consecutive events going to the same modules are delivered as a single batch. Each module of the route
+        # handles the whole batch before the next one does
+        routes = self.routes
+        batch_start = 0
+        batch_route = None
+        for i, event in enumerate(events):
+            route = routes.get(event[0], ())
+            if route is not batch_route:
+                if batch_route:
+                    for module in batch_route:
+                        module.handle_events(events[batch_start:i])
+                batch_start = i
+                batch_route = route
+        if batch_route:
+            for module in batch_route:
+                module.handle_events(events[batch_start:] if batch_start else events)
 
     def handle_next_dependent_event(self):
         for module in self.modules:
-            event = next(module, None)
-            if event:
-                module.handle_event(event)
+            if module.queue:
+                module.handle_event(module.queue.popleft())
                 return True
         return False
 
@@ -27,7 +59,5 @@ class EventEngine:
             while self.handle_next_dependent_event():
                 pass
         except:
-            import sys
-            report = '\n'.join('{}: {}'.format(type(x).__name__, x.report()) for x in self.modules if getattr(x, 'report', None))
-            print(report, file=sys.stderr)
+            print_report(self.modules)
             raise
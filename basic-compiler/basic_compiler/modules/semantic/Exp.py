@@ -1,6 +1,29 @@
-from basic_compiler.modules.semantic import llvm
+import math
+from operator import add, mul, sub, truediv
+
+from basic_compiler.modules.semantic import ir, llvm
 from basic_compiler.modules.syntax_recognizer import SyntaxRecognizer
 
+FOLDABLE_OPERATORS = {
+    '+': add,
+    '-': sub,
+    '*': mul,
+    '/': truediv,
+    '↑': math.pow,
+}
+
+FOLDABLE_FUNCTIONS = {
+    'SIN': math.sin,
+    'COS': math.cos,
+    'TAN': math.tan,
+    'ATN': math.atan,
+    'EXP': math.exp,
+    'ABS': math.fabs,
+    'LOG': math.log,
+    'SQR': math.sqrt,
+    'INT': round,  # llvm.rint rounds half to even, as round does
+}
+
 
 def to_double(number):
     try:
@@ -9,13 +32,29 @@ def to_double(number):
         raise SyntaxRecognizer.CompilerSyntaxError('Not a valid double: {}'.format(number))
 
 
+def fold(function, *operands):
+    '''Evaluate function on literal operands at compile time.
+
+    Returns None if the result can't be written as an LLVM IR literal.'''
+    try:
+        result = float(function(*operands))
+    except (ArithmeticError, ValueError):
+        return None
+    # LLVM IR floating point literals require a decimal point, so exponent notation can't be emitted
+    if not math.isfinite(result) or 'e' in str(result):
+        return None
+    return result
+
+
+# '-u' represents the negative sign leading an expression (unary -)
+OPERATOR_PRIORITY = {'+': 0, '-': 0, '*': 1, '/': 1, '↑': 2, '-u': 3, 'function': 4, '(': 5}
+
+
 def operator_priority(operator):
     # Functions have lower priority than "(", but higher than "n"
     if operator[0].isalpha():
         return 4
-    # '-u' represents the negative sign leading an expression (unary -)
-    PRIORITY = [('+', '-'), ('*', '/'), ('↑',), ('-u',), ('function',), ('(',)]
-    return next((i for i, x in enumerate(PRIORITY) if operator in x))
+    return OPERATOR_PRIORITY[operator]
 
 
 class Exp:
@@ -46,9 +85,18 @@ class Exp:
         self.state.variables.add(variable)
         self.operand_queue.append(variable)
 
+    def start_dimension(self):
+        # Dimensions are evaluated as nested expressions, so that pending operators aren't applied to them
+        self.operator_queue.append('(')
+
     def variable_dimension(self):
-        self.operator_queue.append(',')
-        self.operand_queue.append(self.state.exp_result)
+        # The dimension is left in the operand queue. Mark it and open the scope of the next dimension
+        self.operator_queue.extend((',', '('))
+
+    def end_of_array_variable(self):
+        # Close the scope opened for a further dimension
+        self.operator_queue.pop()
+        self.end_of_variable()
 
     def end_of_variable(self):
         dimensions = []
@@ -56,16 +104,19 @@ class Exp:
             self.operator_queue.pop()
             dimensions.insert(0, self.operand_queue.pop())
         variable = self.operand_queue.pop()
-        register = self.state.loaded_variables.get(variable)
-        if not register:
+        if not dimensions and not self.state.variable_dimensions.get(variable):
+            register = llvm.load_scalar(self.state, variable)
+        else:
             register = '%{}_{}'.format(variable, self.state.uid())
             ptr = llvm.get_variable_ptr(self.state, variable, dimensions)
-            self.state.append_instruction('{} = load double, {}'.format(register, ptr))
+            self.state.append_instruction(ir.Load(register, 'double', ptr))
         self.operand_queue.append(register)
 
     def negate(self, register):
-        negated = '{}_neg'.format(register)
-        self.state.append_instruction('{} = fsub fast double 0., {}'.format(negated, register))
+        if isinstance(register, float):
+            return -register
+        negated = '%neg_{}'.format(self.state.uid())
+        self.state.append_instruction(ir.BinaryOperator(negated, 'fsub', '0.', register))
         return negated
 
     def evaluate_expression(self):
@@ -74,22 +125,64 @@ class Exp:
         else:
             operator = self.operator_queue.pop()
             operand_2, operand = self.operand_queue.pop(), self.operand_queue.pop()
-            if operator == '↑':
-                self.state.external_symbols.add('llvm.pow.f64')
-                register = '%pow_{}'.format(self.state.uid())
-                self.state.append_instruction('{} = tail call fast double @llvm.pow.f64(double {}, double {}) #0'.format(register, operand, operand_2))
-            else:
-                operator_to_instruction = {
-                    '+': 'fadd',
-                    '-': 'fsub',
-                    '*': 'fmul',
-                    '/': 'fdiv',
-                }
-                instruction = operator_to_instruction[operator]
-                register = '%{}_{}'.format(instruction, self.state.uid())
-                self.state.append_instruction('{} = {} fast double {}, {}'.format(register, instruction, operand, operand_2))
+            register = self.simplify(operator, operand, operand_2)
+            if register is None:
+                register = self.operation(operator, operand, operand_2)
         self.operand_queue.append(register)
 
+    def operation(self, operator, operand, operand_2):
+        if operator == '↑':
+            self.state.external_symbols.add('llvm.pow.f64')
+            register = '%pow_{}'.format(self.state.uid())
+            self.state.append_instruction(ir.Call(register, 'double', 'llvm.pow.f64',
+                                                  ['double {}'.format(operand), 'double {}'.format(operand_2)], fast=True))
+            return register
+        operator_to_instruction = {
+            '+': 'fadd',
+            '-': 'fsub',
+            '*': 'fmul',
+            '/': 'fdiv',
+        }
+        instruction = operator_to_instruction[operator]
+        register = '%{}_{}'.format(instruction, self.state.uid())
+        self.state.append_instruction(ir.BinaryOperator(register, instruction, operand, operand_2))
+        return register
+
+    def simplify(self, operator, operand, operand_2):
+        '''Fold literal operations and reduce operations with identity operands.
+
+        Returns the result, or None if code for the operation must be generated.'''
+        if isinstance(operand, float) and isinstance(operand_2, float):
+            result = fold(FOLDABLE_OPERATORS[operator], operand, operand_2)
+            if result is not None:
+                return result
+        if operator == '+':
+            if operand == 0:
+                return operand_2
+            if operand_2 == 0:
+                return operand
+        elif operator == '-':
+            if operand_2 == 0:
+                return operand
+            if operand == 0:
+                return self.negate(operand_2)
+        elif operator == '*':
+            if operand == 1:
+                return operand_2
+            if operand_2 == 1:
+                return operand
+        elif operator == '/':
+            if operand_2 == 1:
+                return operand
+        elif operator == '↑':
+            if operand_2 == 1:
+                return operand
+            if operand_2 == 2:
+                register = '%fmul_{}'.format(self.state.uid())
+                self.state.append_instruction(ir.BinaryOperator(register, 'fmul', operand, operand))
+                return register
+        return None
+
     def evaluate_scope(self):
         # Evaluate until start of scope ("(" or start of expression)
         while self.operator_queue:
@@ -98,12 +191,11 @@ class Exp:
             self.evaluate_expression()
 
     def operator(self, operator):
-        if self.operator_queue:
-            # If pending operators are stacked, first check if current operator can be stacked given its priority
-            queue_top_priority = operator_priority(self.operator_queue[-1])
-            if operator_priority(operator) <= queue_top_priority:
-                # Can't stack, evaluate previous expression first
-                self.evaluate_scope()
+        # Pending operators of the current scope with higher or equal priority can't be stacked, evaluate them first
+        priority = operator_priority(operator)
+        while self.operator_queue and self.operator_queue[-1] != '(' and \
+                operator_priority(self.operator_queue[-1]) >= priority:
+            self.evaluate_expression()
         self.operator_queue.append(operator.upper())
 
     def end_expression(self):
@@ -115,12 +207,20 @@ class Exp:
             self.state.exp_result = self.operand_queue.pop()
 
     def call_function(self, function):
-        register = '%{}_{}'.format(function, self.state.uid())
         operand = self.operand_queue.pop()
+        if isinstance(operand, float) and function in FOLDABLE_FUNCTIONS:
+            result = fold(FOLDABLE_FUNCTIONS[function], operand)
+            if result is not None:
+                self.operand_queue.append(result)
+                return
+        if function in self.state.inline_functions:
+            self.operand_queue.append(self.inline_function(function, operand))
+            return
+        register = '%{}_{}'.format(function, self.state.uid())
         if function.startswith('FN'):
             # Call user defined function
             self.state.referenced_functions.add(function)
-            self.state.append_instruction('{} = tail call fast double @{}(double {}) #0'.format(register, function, operand))
+            self.state.append_instruction(ir.Call(register, 'double', function, ['double {}'.format(operand)], fast=True))
         else:
             built_in_to_implementation = {
                 'SIN': 'llvm.sin.f64',
@@ -142,13 +242,28 @@ class Exp:
             self.state.external_symbols.add(implementation)
             if function == 'RND':
                 # Call rand, cast to double and divide by RAND_MAX (platform-specific, 2147483647 on Linux)
-                self.state.append_instruction('{}_int = call i32 @rand() #0'.format(register))
-                self.state.append_instruction('{r}_double = sitofp i32 {r}_int to double'.format(r=register))
-                self.state.append_instruction('{r} = fdiv double {r}_double, 2147483647.'.format(r=register))
+                self.state.append_instruction(ir.Call('{}_int'.format(register), 'i32', 'rand', [], tail=False))
+                self.state.append_instruction(
+                    ir.Cast('{}_double'.format(register), 'sitofp', 'i32', '{}_int'.format(register), 'double'))
+                self.state.append_instruction(
+                    ir.BinaryOperator(register, 'fdiv', '{}_double'.format(register), '2147483647.', flags=None))
             else:
-                self.state.append_instruction('{} = tail call fast double @{}(double {}) #0'.format(register, implementation, operand))
+                self.state.append_instruction(
+                    ir.Call(register, 'double', implementation, ['double {}'.format(operand)], fast=True))
         self.operand_queue.append(register)
 
+    def inline_function(self, function, operand):
+        '''Copy the code of a DEF FN function, with the argument replaced by operand and registers renamed.
+
+        Returns the result of the function.'''
+        instructions, result = self.state.inline_functions[function]
+        suffix = '.{}{}'.format(function, self.state.uid())
+        values = {'%arg': operand}
+        values.update((x.result, '{}{}'.format(x.result, suffix)) for x in instructions if getattr(x, 'result', None))
+        for instruction in instructions:
+            self.state.append_instruction(ir.substitute(instruction, values))
+        return values.get(result, result)
+
     def end_nested_expression(self):
         # Check if expression was the argument of a function call
         if self.operator_queue and self.operator_queue[-1][0].isalpha():
@@ -0,0 +1,190 @@
+from collections import namedtuple
+
+from basic_compiler.modules.semantic import ir, llvm
+from basic_compiler.modules.semantic.Exp import Exp, to_double
+from basic_compiler.modules.syntax_recognizer import SyntaxRecognizer
+
+# Expression tree nodes. Equal nodes compute equal values, so they're evaluated once per expression
+Number = namedtuple('Number', ['value'])
+Variable = namedtuple('Variable', ['name', 'dimensions'])
+Negative = namedtuple('Negative', ['operand'])
+BinaryOperation = namedtuple('BinaryOperation', ['operator', 'left', 'right'])
+# serial tells calls with side effects apart (RND), and is 0 for other functions
+FunctionCall = namedtuple('FunctionCall', ['function', 'argument', 'serial'])
+
+BINARY_OPERATOR_PRECEDENCE = {
+    '+': 1,
+    '-': 1,
+    '*': 2,
+    '/': 2,
+    '↑': 3,
+}
+
+
+class ExpressionParser:
+    '''Precedence climbing parser of the tokens of an expression. All binary operators are left associative, and the
+    leading negative sign binds tighter than any of them.'''
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.serial = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def expect(self, kind):
+        token = self.next()
+        if token[0] != kind:
+            raise SyntaxRecognizer.CompilerSyntaxError('Expected {} in expression, got {}'.format(kind, token))
+
+    def parse(self):
+        tree = self.expression(1)
+        if self.position != len(self.tokens):
+            raise SyntaxRecognizer.CompilerSyntaxError('Unexpected {} in expression'.format(self.peek()))
+        return tree
+
+    def expression(self, minimum_precedence):
+        left = self.unary()
+        while True:
+            kind, operator = self.peek()
+            precedence = BINARY_OPERATOR_PRECEDENCE.get(operator) if kind == 'operator' else None
+            if precedence is None or precedence < minimum_precedence:
+                return left
+            self.position += 1
+            left = BinaryOperation(operator, left, self.expression(precedence + 1))
+
+    def unary(self):
+        negative = False
+        while self.peek()[0] == 'negative':
+            self.position += 1
+            negative = not negative
+        operand = self.primary()
+        if not negative:
+            return operand
+        if isinstance(operand, Number):
+            return Number(-operand.value)
+        return Negative(operand)
+
+    def primary(self):
+        kind, value = self.next()
+        if kind == 'number':
+            return Number(value)
+        if kind == '(':
+            tree = self.expression(1)
+            self.expect(')')
+            return tree
+        if kind == 'function':
+            self.expect('(')
+            argument = self.expression(1)
+            self.expect(')')
+            serial = 0
+            if value == 'RND':
+                self.serial += 1
+                serial = self.serial
+            return FunctionCall(value, argument, serial)
+        if kind == 'variable':
+            dimensions = []
+            if self.peek()[0] == '[':
+                self.position += 1
+                # Each dimension is followed by a ','
+                while self.peek()[0] != ']':
+                    dimensions.append(self.expression(1))
+                    self.expect(',')
+                self.position += 1
+            return Variable(value, tuple(dimensions))
+        raise SyntaxRecognizer.CompilerSyntaxError('Unexpected {} in expression'.format((kind, value)))
+
+
+class ExpTree(Exp):
+    '''Expression engine collecting the tokens of a whole expression, which is then parsed to a tree and compiled.
+
+    It handles the same semantic actions as Exp.'''
+    def __init__(self, state):
+        super().__init__(state)
+        self.tokens = []
+        # Open parentheses and array dimensions
+        self.depth = 0
+
+    def negative_expression(self):
+        self.tokens.append(('negative', None))
+
+    def number(self, number):
+        self.tokens.append(('number', to_double(number)))
+
+    def variable(self, variable):
+        variable = variable.upper()
+        self.state.variables.add(variable)
+        self.tokens.append(('variable', variable))
+
+    def start_dimension(self):
+        self.depth += 1
+        self.tokens.append(('[', None))
+
+    def variable_dimension(self):
+        self.tokens.append((',', None))
+
+    def end_of_array_variable(self):
+        self.depth -= 1
+        self.tokens.append((']', None))
+
+    def end_of_variable(self):
+        pass
+
+    def operator(self, operator):
+        if operator == '(':
+            self.depth += 1
+            self.tokens.append(('(', None))
+        elif operator[0].isalpha():
+            self.tokens.append(('function', operator.upper()))
+        else:
+            self.tokens.append(('operator', operator))
+
+    def end_nested_expression(self):
+        self.depth -= 1
+        self.tokens.append((')', None))
+
+    def end_expression(self):
+        if self.depth:
+            # End of a nested expression or array dimension
+            return
+        tree = ExpressionParser(self.tokens).parse()
+        self.tokens = []
+        self.state.exp_result = self.compile(tree, {})
+
+    def compile(self, node, values):
+        '''Emit code for an expression tree, returning its result. values holds the results of compiled subtrees.'''
+        value = values.get(node)
+        if value is not None:
+            return value
+        if isinstance(node, Number):
+            value = node.value
+        elif isinstance(node, Variable):
+            value = self.load_variable(node, values)
+        elif isinstance(node, Negative):
+            value = self.negate(self.compile(node.operand, values))
+        elif isinstance(node, BinaryOperation):
+            left = self.compile(node.left, values)
+            right = self.compile(node.right, values)
+            value = self.simplify(node.operator, left, right)
+            if value is None:
+                value = self.operation(node.operator, left, right)
+        else:
+            self.operand_queue.append(self.compile(node.argument, values))
+            self.call_function(node.function)
+            value = self.operand_queue.pop()
+        values[node] = value
+        return value
+
+    def load_variable(self, node, values):
+        if not node.dimensions and not self.state.variable_dimensions.get(node.name):
+            return llvm.load_scalar(self.state, node.name)
+        dimensions = [self.compile(x, values) for x in node.dimensions]
+        register = '%{}_{}'.format(node.name, self.state.uid())
+        self.state.append_instruction(
+            ir.Load(register, 'double', llvm.get_variable_ptr(self.state, node.name, dimensions)))
+        return register
@@ -1,12 +1,25 @@
-from basic_compiler.modules.semantic import llvm
+from basic_compiler.modules.semantic import ir, llvm
+from basic_compiler.modules.semantic.placeholders import IntegerCounterCode
+
+
+def is_integer_literal(value):
+    # Integers above 2^53 can't be converted exactly between i64 and double
+    return isinstance(value, float) and value.is_integer() and abs(value) < 2 ** 53
 
 
 class ForContext:
     def __init__(self, variable):
         self.variable = variable
+        self.start = None
         self.end = None
         self.step = None
         self.identifier = None
+        # Global with an i64 copy of the counter, if start, end and step are integer literals
+        self.counter = None
+
+
+def counter_ptr(counter):
+    return ir.Pointer('i64', '@{}'.format(counter), 8)
 
 
 class For:
@@ -19,7 +32,13 @@ class For:
         self.state.for_context.append(ForContext(variable))
 
     def left_exp(self):
-        llvm.assign_to(self.state, self.state.for_context[-1].variable)
+        variable = self.state.for_context[-1].variable
+        self.state.for_context[-1].start = self.state.exp_result
+        llvm.assign_to(self.state, variable)
+        # The i64 counter of a loop is only kept in sync with its variable if no other FOR statement assigns it
+        if variable in self.state.for_variables:
+            self.state.assigned_variables.add(variable)
+        self.state.for_variables.add(variable)
 
     def right_exp(self):
         if isinstance(self.state.exp_result, float):
@@ -32,6 +51,9 @@ class For:
             end = right_exp_variable
         self.state.for_context[-1].end = end
 
+    def default_step_value(self, _):
+        self.step_value(1.)
+
     def step_value(self, value):
         if isinstance(value, float):
             # Implicit 1 step
@@ -44,7 +66,13 @@ class For:
             step = 'for_{}_step_{}'.format(variable, self.state.uid())
             self.state.private_globals.append('@{} = internal global double 0., align 8'.format(step))
             llvm.assign_to(self.state, step)
-        self.state.for_context[-1].step = step
+        for_context = self.state.for_context[-1]
+        for_context.step = step
+        if step and all(is_integer_literal(x) for x in (for_context.start, for_context.end, step)):
+            for_context.counter = 'for_{}_counter_{}'.format(for_context.variable, self.state.uid())
+            self.state.private_globals.append('@{} = internal global i64 0, align 8'.format(for_context.counter))
+            self.state.append_instruction(IntegerCounterCode(
+                for_context.variable, [ir.Store('i64', int(for_context.start), counter_ptr(for_context.counter))], []))
 
     def next(self, variable):
         variable = variable.upper()
@@ -60,53 +88,95 @@ class For:
         end = for_context.end
         self.state.goto_targets.add(identifier)
         label = 'label_{}'.format(identifier)
-        old_value = '{}_{}'.format(variable, self.state.uid())
-        self.state.append_instruction('%{} = load double, double* @{}, align 8'.format(old_value, variable))
+        if for_context.counter:
+            self.integer_next(for_context, label)
+            return
+        old_value = llvm.load_scalar(self.state, variable)
         new_value = 'new_{}_{}'.format(variable, self.state.uid())
         if isinstance(step, float):
             step_value = step
         else:
             # Load step
             step_value = '%step_{}'.format(self.state.uid())
-            self.state.append_instruction('{} = load double, double* @{}, align 8'.format(step_value, step))
+            self.state.append_instruction(ir.Load(step_value, 'double', ir.Pointer('double', '@{}'.format(step), 8)))
         # Update variable by step
-        self.state.append_instruction('%{} = fadd fast double %{}, {}'.format(new_value, old_value, step_value))
-        self.state.append_instruction('store double %{}, double* @{}, align 8'.format(new_value, variable))
+        self.state.append_instruction(
+            ir.BinaryOperator('%{}'.format(new_value), 'fadd', old_value, step_value))
+        self.state.append_instruction(ir.Store('double', '%{}'.format(new_value), llvm.scalar_ptr(variable)))
+        self.state.remember_variable(variable, '%{}'.format(new_value))
         # Load end value
         if isinstance(end, float):
             end_value = end
         else:
             end_value = '%end_{}_{}'.format(variable, self.state.uid())
-            self.state.append_instruction('{} = load double, double* @{}, align 8'.format(end_value, end))
+            self.state.append_instruction(ir.Load(end_value, 'double', ir.Pointer('double', '@{}'.format(end), 8)))
         will_jump = 'will_jump_{}'.format(self.state.uid())
         for_exit = 'for_exit_{}'.format(self.state.uid())
         if isinstance(step, float):
             # Step is a literal, so generate a different code path based on its sign
             if step > 0:
                 # If new_value <= end, jump to loop, else continue execution
-                self.state.append_instruction('%{} = fcmp ole double %{}, {}'.format(will_jump, new_value, end_value))
-                self.state.append_instruction('br i1 %{}, label %{}, label %{}'.format(will_jump, label, for_exit))
+                self.state.append_instruction(ir.FCmp('%{}'.format(will_jump), 'ole', '%{}'.format(new_value), end_value))
+                self.state.append_instruction(ir.CondBr('%{}'.format(will_jump), label, for_exit))
             else:
                 # If new_value >= end, jump to loop, else continue execution
-                self.state.append_instruction('%{} = fcmp oge double %{}, {}'.format(will_jump, new_value, end_value))
-                self.state.append_instruction('br i1 %{}, label %{}, label %{}'.format(will_jump, label, for_exit))
+                self.state.append_instruction(ir.FCmp('%{}'.format(will_jump), 'oge', '%{}'.format(new_value), end_value))
+                self.state.append_instruction(ir.CondBr('%{}'.format(will_jump), label, for_exit))
         else:
             # Step is an expression, generate code to check its sign
             sign = 'step_sign_{}'.format(self.state.uid())
             positive = 'positive_{}'.format(self.state.uid())
             negative = 'negative_{}'.format(self.state.uid())
-            self.state.append_instruction('%{} = fcmp oge double {}, 0.'.format(sign, step_value))
-            self.state.append_instruction('br i1 %{}, label %{}, label %{}'.format(sign, positive, negative))
+            self.state.append_instruction(ir.FCmp('%{}'.format(sign), 'oge', step_value, '0.'))
+            self.state.append_instruction(ir.CondBr('%{}'.format(sign), positive, negative))
             # If step >= 0
-            self.state.append_instruction('{}:'.format(positive))
+            self.state.append_instruction(ir.Label(positive))
             # If new_value <= end, jump to loop, else continue execution
-            self.state.append_instruction('%{} = fcmp ole double %{}, {}'.format(will_jump, new_value, end_value))
-            self.state.append_instruction('br i1 %{}, label %{}, label %{}'.format(will_jump, label, for_exit))
+            self.state.append_instruction(ir.FCmp('%{}'.format(will_jump), 'ole', '%{}'.format(new_value), end_value))
+            self.state.append_instruction(ir.CondBr('%{}'.format(will_jump), label, for_exit))
             # step < 0
-            self.state.append_instruction('{}:'.format(negative))
+            self.state.append_instruction(ir.Label(negative))
             # If new_value >= end, jump to loop, else continue execution
             will_jump_2 = 'will_jump_2_{}'.format(self.state.uid())
-            self.state.append_instruction('%{} = fcmp oge double %{}, {}'.format(will_jump_2, new_value, end_value))
-            self.state.append_instruction('br i1 %{}, label %{}, label %{}'.format(will_jump_2, label, for_exit))
+            self.state.append_instruction(ir.FCmp('%{}'.format(will_jump_2), 'oge', '%{}'.format(new_value), end_value))
+            self.state.append_instruction(ir.CondBr('%{}'.format(will_jump_2), label, for_exit))
         # Exit of for loop
-        self.state.append_instruction('{}:'.format(for_exit))
+        self.state.append_instruction(ir.Label(for_exit))
+
+    def integer_next(self, for_context, label):
+        '''Update and test the i64 copy of the counter, converting it to double only to store the BASIC variable.
+
+        The i64 counter can only be used if no other statement assigns the variable, which is only known at the end, so
+        code using a double counter is also generated.'''
+        variable = for_context.variable
+        step = for_context.step
+        uid = self.state.uid()
+        new_value = '%new_{}_{}'.format(variable, uid)
+        will_jump = '%will_jump_{}'.format(uid)
+        for_exit = 'for_exit_{}'.format(uid)
+        count = '%{}_count_{}'.format(variable, uid)
+        next_count = '%{}_count_{}_next'.format(variable, uid)
+        # The double counter is only loaded by the fallback code
+        old_value = self.state.variable_value(variable)
+        load = []
+        if old_value is None:
+            old_value = '%{}_{}'.format(variable, uid)
+            load.append(ir.Load(old_value, 'double', llvm.scalar_ptr(variable)))
+        integer_code = [
+            ir.Load(count, 'i64', counter_ptr(for_context.counter)),
+            ir.BinaryOperator(next_count, 'add', count, int(step), type='i64', flags='nsw'),
+            ir.Store('i64', next_count, counter_ptr(for_context.counter)),
+            ir.Cast(new_value, 'sitofp', 'i64', next_count, 'double'),
+            ir.Store('double', new_value, llvm.scalar_ptr(variable)),
+            ir.ICmp(will_jump, 'sle' if step > 0 else 'sge', 'i64', next_count, int(for_context.end)),
+            ir.CondBr(will_jump, label, for_exit),
+        ]
+        double_code = load + [
+            ir.BinaryOperator(new_value, 'fadd', old_value, step),
+            ir.Store('double', new_value, llvm.scalar_ptr(variable)),
+            ir.FCmp(will_jump, 'ole' if step > 0 else 'oge', new_value, for_context.end),
+            ir.CondBr(will_jump, label, for_exit),
+        ]
+        self.state.append_instruction(IntegerCounterCode(variable, integer_code, double_code))
+        self.state.remember_variable(variable, new_value)
+        self.state.append_instruction(ir.Label(for_exit))
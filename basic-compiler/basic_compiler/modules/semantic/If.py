@@ -1,4 +1,4 @@
-from basic_compiler.modules.semantic import llvm
+from basic_compiler.modules.semantic import ir, llvm
 
 
 class If:
@@ -24,12 +24,11 @@ class If:
 
     def right_exp(self):
         self.cond_register = '%cond_{}'.format(self.state.uid())
-        self.state.append_instruction(
-            '{} = fcmp {} double {}, {}'.format(self.cond_register, self.cond, self.left, self.state.exp_result))
+        self.state.append_instruction(ir.FCmp(self.cond_register, self.cond, self.left, self.state.exp_result))
 
     def target(self, target):
         target = llvm.to_int(target)
         self.state.goto_targets.add(target)
         if_unequal = 'cond_false_{}'.format(self.state.uid())
-        self.state.append_instruction('br i1 {}, label %label_{}, label %{}'.format(self.cond_register, target, if_unequal))
-        self.state.append_instruction('{}:'.format(if_unequal))
+        self.state.append_instruction(ir.CondBr(self.cond_register, 'label_{}'.format(target), if_unequal))
+        self.state.append_instruction(ir.Label(if_unequal))
@@ -1,21 +1,33 @@
+from basic_compiler.modules.semantic import ir
+from basic_compiler.modules.semantic.runtime import EXTERNAL_SYMBOLS as RUNTIME_EXTERNAL_SYMBOLS
+
+
+def string_pointer(identifier, length):
+    return 'i8* getelementptr inbounds ([{len} x i8], [{len} x i8]* {identifier}, i32 0, i32 0)'.format(
+        len=length, identifier=identifier)
+
+
+def is_number(element):
+    # Number literal or local register
+    return isinstance(element, float) or element.startswith('%')
+
+
+def encode_string_literal(element):
+    # Unescape and encode double quotes, encode "\"
+    return element[1:-1].replace('""', '\\22').replace('\\', '\\5C')
+
+
 class Print:
     def __init__(self, state):
         self.state = state
         self.print_parameters = []
 
     def newline(self):
+        if self.state.options.buffered_print:
+            self.buffered_call('print_char', ['i8 10'])
+            return
         self.state.external_symbols.add('putchar')
-        self.state.append_instruction('tail call i32 @putchar(i32 10) #0')
-
-    def const_string(self, literal, newline=False):
-        # Create a constant null-terminated string, global to this module
-        string_constant_identifier = '@.str{}'.format(len(self.state.private_globals))
-        # Add one byte for the null-terminator and don't count escape sequences
-        string_length = len(literal) + 1 - 2 * literal.count('\\')
-        self.state.private_globals.append(
-            '{} = private unnamed_addr constant [{} x i8] c"{}\\00", align 1'
-            .format(string_constant_identifier, string_length, literal))
-        return string_constant_identifier, string_length
+        self.state.append_instruction(ir.Call(None, 'i32', 'putchar', ['i32 10']))
 
     def string(self, element):
         self.print_parameters.append(element)
@@ -23,33 +35,48 @@ class Print:
     def expression_result(self):
         self.print_parameters.append(self.state.exp_result)
 
-    def end(self, _, suffix=''):
+    def buffered_call(self, function, arguments):
+        self.state.has_buffered_output = True
+        self.state.external_symbols.update(RUNTIME_EXTERNAL_SYMBOLS)
+        self.state.append_instruction(ir.Call(None, 'void', function, arguments))
+
+    def buffered_end(self, newline):
+        for i, element in enumerate(self.print_parameters):
+            if i:
+                self.buffered_call('print_char', ['i8 32'])
+            if is_number(element):
+                self.buffered_call('print_double', ['double {}'.format(element)])
+            elif element.startswith('"'):
+                str_id, str_len = self.state.intern_string(encode_string_literal(element))
+                # The null-terminator isn't printed
+                self.buffered_call('print_bytes', [string_pointer(str_id, str_len), 'i64 {}'.format(str_len - 1)])
+        if newline:
+            self.buffered_call('print_char', ['i8 10'])
+
+    def printf_end(self, newline):
         self.state.external_symbols.add('printf')
 
         format_parameters = []
         va_args = []
         for element in self.print_parameters:
-            if isinstance(element, float) or element.startswith('%'):
-                # Print number literal or local register
+            if is_number(element):
                 format_parameters.append('%f')
                 va_args.append('double {}'.format(element))
             elif element.startswith('"'):
-                # Print string literal
-                # Unescape and encode double quotes, encode "\"
-                element = element[1:-1].replace('""', '\\22').replace('\\', '\\5C')
                 format_parameters.append('%s')
                 # Create a constant string
-                str_id, str_len = self.const_string(element)
-                va_args.append('i8* getelementptr inbounds ([{len} x i8], [{len} x i8]* {str_id}, i32 0, i32 0)'.format(len=str_len, str_id=str_id))
-
-        format_string_id, length = self.const_string(' '.join(format_parameters) + suffix)
-        self.state.append_instruction(
-            'tail call i32 (i8*, ...) @printf(i8* getelementptr inbounds ([{len} x i8], [{len} x i8]* {identifier}, i32 0, i32 0), {va_args}) #0'.format(
-                len=length,
-                identifier=format_string_id,
-                va_args=', '.join(va_args),
-            ))
+                str_id, str_len = self.state.intern_string(encode_string_literal(element))
+                va_args.append(string_pointer(str_id, str_len))
+
+        format_string = string_pointer(*self.state.intern_string(' '.join(format_parameters) + ('\\0A' if newline else '')))
+        self.state.append_instruction(ir.Call(None, 'i32 (i8*, ...)', 'printf', [format_string] + va_args))
+
+    def end(self, _, newline=False):
+        if self.state.options.buffered_print:
+            self.buffered_end(newline)
+        else:
+            self.printf_end(newline)
         self.print_parameters = []
 
     def end_with_newline(self):
-        self.end(None, suffix='\\0A')
+        self.end(None, newline=True)
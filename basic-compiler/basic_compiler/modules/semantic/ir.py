@@ -0,0 +1,273 @@
+'''In-memory LLVM IR instructions. They are only serialized to text when the module is written.'''
+from collections import namedtuple
+import re
+
+REGISTER = re.compile(r'%[\w.]+')
+
+
+class Pointer(namedtuple('Pointer', ['type', 'address', 'align'])):
+    __slots__ = ()
+
+    def __str__(self):
+        return '{}* {}, align {}'.format(self.type, self.address, self.align)
+
+
+class Instruction:
+    __slots__ = ()
+    is_terminator = False
+
+    def __str__(self):
+        return self.to_ll()
+
+    def to_ll(self):
+        raise NotImplementedError()
+
+
+class Label(Instruction):
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def to_ll(self):
+        return '{}:'.format(self.name)
+
+
+class Comment(Instruction):
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def to_ll(self):
+        return ';{}'.format(self.text)
+
+
+class Load(Instruction):
+    __slots__ = ('result', 'type', 'pointer')
+
+    def __init__(self, result, type, pointer):
+        self.result = result
+        self.type = type
+        self.pointer = pointer
+
+    def to_ll(self):
+        return '{} = load {}, {}'.format(self.result, self.type, self.pointer)
+
+
+class Store(Instruction):
+    __slots__ = ('type', 'value', 'pointer')
+
+    def __init__(self, type, value, pointer):
+        self.type = type
+        self.value = value
+        self.pointer = pointer
+
+    def to_ll(self):
+        return 'store {} {}, {}'.format(self.type, self.value, self.pointer)
+
+
+class BinaryOperator(Instruction):
+    __slots__ = ('result', 'opcode', 'type', 'operands', 'flags')
+
+    def __init__(self, result, opcode, operand_1, operand_2, type='double', flags='fast'):
+        self.result = result
+        self.opcode = opcode
+        self.type = type
+        self.operands = (operand_1, operand_2)
+        self.flags = flags
+
+    def to_ll(self):
+        return '{} = {}{} {} {}, {}'.format(
+            self.result, self.opcode, ' {}'.format(self.flags) if self.flags else '', self.type, *self.operands)
+
+
+class FCmp(Instruction):
+    __slots__ = ('result', 'predicate', 'operands')
+
+    def __init__(self, result, predicate, operand_1, operand_2):
+        self.result = result
+        self.predicate = predicate
+        self.operands = (operand_1, operand_2)
+
+    def to_ll(self):
+        return '{} = fcmp {} double {}, {}'.format(self.result, self.predicate, *self.operands)
+
+
+class ICmp(Instruction):
+    __slots__ = ('result', 'predicate', 'type', 'operands')
+
+    def __init__(self, result, predicate, type, operand_1, operand_2):
+        self.result = result
+        self.predicate = predicate
+        self.type = type
+        self.operands = (operand_1, operand_2)
+
+    def to_ll(self):
+        return '{} = icmp {} {} {}, {}'.format(self.result, self.predicate, self.type, *self.operands)
+
+
+class Cast(Instruction):
+    __slots__ = ('result', 'opcode', 'from_type', 'value', 'to_type')
+
+    def __init__(self, result, opcode, from_type, value, to_type):
+        self.result = result
+        self.opcode = opcode
+        self.from_type = from_type
+        self.value = value
+        self.to_type = to_type
+
+    def to_ll(self):
+        return '{} = {} {} {} to {}'.format(self.result, self.opcode, self.from_type, self.value, self.to_type)
+
+
+class GetElementPtr(Instruction):
+    __slots__ = ('result', 'type', 'address', 'indices', 'inbounds')
+
+    def __init__(self, result, type, address, indices, inbounds=True):
+        self.result = result
+        self.type = type
+        self.address = address
+        self.indices = indices
+        self.inbounds = inbounds
+
+    def to_ll(self):
+        return '{} = {}'.format(self.result, getelementptr(self.type, self.address, self.indices, self.inbounds))
+
+
+class OffsetPtr(Instruction):
+    __slots__ = ('result', 'type', 'address', 'offset')
+
+    def __init__(self, result, type, address, offset):
+        self.result = result
+        self.type = type
+        self.address = address
+        self.offset = offset
+
+    def to_ll(self):
+        return '{r} = getelementptr inbounds {type}, {type}* {address}, i64 {offset}'.format(
+            r=self.result, type=self.type, address=self.address, offset=self.offset)
+
+
+def getelementptr(type, address, indices, inbounds=True, constant=False):
+    # Operands of constant expressions (used when all indices are constant) are enclosed in parentheses
+    return 'getelementptr {inbounds}{open}{type}, {type}* {address}, i32 0, {indices}{close}'.format(
+        inbounds='inbounds ' if inbounds else '', type=type, address=address,
+        indices=', '.join('i32 {}'.format(x) for x in indices), open='(' if constant else '', close=')' if constant else '')
+
+
+class Call(Instruction):
+    __slots__ = ('result', 'return_type', 'function', 'arguments', 'fast', 'tail', 'attributes')
+
+    def __init__(self, result, return_type, function, arguments, fast=False, tail=True, attributes='#0'):
+        self.result = result
+        self.return_type = return_type
+        self.function = function
+        self.arguments = arguments
+        self.fast = fast
+        self.tail = tail
+        self.attributes = attributes
+
+    def to_ll(self):
+        return '{}{}call {}{} @{}({}) {}'.format(
+            '{} = '.format(self.result) if self.result else '',
+            'tail ' if self.tail else '',
+            'fast ' if self.fast else '',
+            self.return_type,
+            self.function,
+            ', '.join(self.arguments),
+            self.attributes)
+
+
+class Br(Instruction):
+    __slots__ = ('label',)
+    is_terminator = True
+
+    def __init__(self, label):
+        self.label = label
+
+    def to_ll(self):
+        return 'br label %{}'.format(self.label)
+
+
+class CondBr(Instruction):
+    __slots__ = ('condition', 'if_true', 'if_false')
+    is_terminator = True
+
+    def __init__(self, condition, if_true, if_false):
+        self.condition = condition
+        self.if_true = if_true
+        self.if_false = if_false
+
+    def to_ll(self):
+        return 'br i1 {}, label %{}, label %{}'.format(self.condition, self.if_true, self.if_false)
+
+
+class IndirectBr(Instruction):
+    __slots__ = ('address', 'labels')
+    is_terminator = True
+
+    def __init__(self, address, labels):
+        self.address = address
+        self.labels = labels
+
+    def to_ll(self):
+        return 'indirectbr i8* {}, [ {} ]'.format(self.address, ', '.join('label %{}'.format(x) for x in self.labels))
+
+
+class Switch(Instruction):
+    __slots__ = ('type', 'value', 'default', 'cases')
+    is_terminator = True
+
+    def __init__(self, type, value, default, cases):
+        self.type = type
+        self.value = value
+        self.default = default
+        # List of (case value, label)
+        self.cases = cases
+
+    def to_ll(self):
+        return 'switch {type} {value}, label %{default} [ {cases} ]'.format(
+            type=self.type, value=self.value, default=self.default,
+            cases=' '.join('{} {}, label %{}'.format(self.type, x, label) for x, label in self.cases))
+
+
+class Ret(Instruction):
+    __slots__ = ('type', 'value')
+    is_terminator = True
+
+    def __init__(self, type='void', value=None):
+        self.type = type
+        self.value = value
+
+    def to_ll(self):
+        if self.value is None:
+            return 'ret {}'.format(self.type)
+        return 'ret {} {}'.format(self.type, self.value)
+
+
+class Unreachable(Instruction):
+    __slots__ = ()
+    is_terminator = True
+
+    def to_ll(self):
+        return 'unreachable'
+
+
+def substitute_value(value, values):
+    if isinstance(value, str):
+        return REGISTER.sub(lambda m: str(values.get(m.group(), m.group())), value)
+    if isinstance(value, Pointer):
+        return value._replace(address=substitute_value(value.address, values))
+    if isinstance(value, (list, tuple)):
+        return type(value)(substitute_value(x, values) for x in value)
+    return value
+
+
+def substitute(instruction, values):
+    '''Return a copy of instruction with registers replaced by values, a dict of register -> value.'''
+    result = object.__new__(type(instruction))
+    for cls in type(instruction).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            setattr(result, slot, substitute_value(getattr(instruction, slot), values))
+    return result
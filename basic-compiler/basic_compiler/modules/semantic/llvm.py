@@ -1,10 +1,19 @@
+import io
+import itertools
 import os
 
 from basic_compiler.modules.semantic.Exp import Exp
+from basic_compiler.modules.semantic.ExpTree import ExpTree
 from basic_compiler.modules.semantic.For import For
 from basic_compiler.modules.semantic.If import If
 from basic_compiler.modules.semantic.Print import Print
 from basic_compiler.modules.semantic.functions import Function, LLVM_TAIL, Main, Program
+from basic_compiler.modules.semantic import ir
+from basic_compiler.modules.semantic.options import CodegenOptions
+from basic_compiler.modules.semantic.placeholders import (
+    DataElementPtr, FlushOutput, ForwardedLoad, IntegerCounterCode, LabelBranch, LabelDefinition, Resolution,
+    ReturnDispatch)
+from basic_compiler.modules.semantic.runtime import PRINT_RUNTIME
 
 
 class SemanticError(RuntimeError):
@@ -12,40 +21,100 @@ class SemanticError(RuntimeError):
 
 
 def is_block_terminator(instruction):
-    if not isinstance(instruction, str):
-        return False  # not known yet
-    opcode = instruction.lstrip().split()[0]
-    return opcode in (
-        'ret', 'br', 'switch', 'indirectbr', 'invoke', 'resume', 'catchswitch', 'catchret', 'cleanupret', 'unreachable')
+    # Placeholders aren't known yet
+    return isinstance(instruction, ir.Instruction) and instruction.is_terminator
 
 
 class SemanticState:
-    def __init__(self, filename):
+    def __init__(self, filename, options=CodegenOptions()):
         self.filename = filename
+        self.options = options
         self.exp_result = None
         self.functions = []
         self.current_function = None
         self.referenced_functions = set()
+        # Code of DEF FN functions that can be inlined, as name -> (instructions, result)
+        self.inline_functions = {}
         self.entry_point = None
         self.defined_labels = set()
         self.goto_targets = set()
         self.gosub_targets = set()
+        # Number of GOSUB statements pushing return addresses, numbered from 1 (0 returns from the program to main)
+        self.return_addresses = 0
+        self.has_return_stack = False
+        # Whether the block exiting the program on return stack overflow was emitted (by the first GOSUB)
+        self.has_return_stack_overflow = False
         self.const_data = []
         self.uid_count = -1
         self.has_read = False
+        # Whether PRINT uses the output buffer of the runtime
+        self.has_buffered_output = False
         self.variables = set()
+        # Scalar variables assigned by LET, READ, or by more than one FOR statement
+        self.assigned_variables = set()
+        # Control variables of FOR statements
+        self.for_variables = set()
         self.private_globals = []
+        # Constant null-terminated strings, as contents -> (identifier, length), in creation order
+        self.string_constants = {}
         self.external_symbols = set()
+        # Values of scalar variables known in registers, as variable -> (value, len(crossed_labels) when recorded)
         self.loaded_variables = {}
+        # Numbered lines seen since the variable values were recorded. Any of them may start a basic block
+        self.crossed_labels = []
+        # Array indices converted to i32 and element pointers computed in the current basic block, by their operands
+        self.block_values = {}
+        # Scalar variable loaded into each register, to find FOR counters used as indices
+        self.register_variables = {}
         self.for_context = []
         self.variable_dimensions = {}
+        # Arrays allocated on the heap, by their number of elements
+        self.heap_arrays = {}
+        # String constant (identifier, length) printed if heap arrays can't be allocated
+        self.heap_error_message = None
 
     def uid(self):
         self.uid_count += 1
         return self.uid_count
 
+    def intern_string(self, literal):
+        '''Return the identifier and length of a constant null-terminated string global to this module, creating it
+        only the first time its contents are seen.'''
+        string_constant = self.string_constants.get(literal)
+        if string_constant is None:
+            # Add one byte for the null-terminator and don't count escape sequences
+            string_constant = ('@.str{}'.format(len(self.string_constants)), len(literal) + 1 - 2 * literal.count('\\'))
+            self.string_constants[literal] = string_constant
+        return string_constant
+
     def append_instruction(self, instruction):
         self.current_function.append(instruction)
+        if isinstance(instruction, ir.Label):
+            self.block_values = {}
+
+    def variable_value(self, variable):
+        '''Return the value of a scalar variable if it's known in a register, or None.'''
+        loaded = self.loaded_variables.get(variable)
+        if loaded is None:
+            return None
+        value, label_count = loaded
+        labels = self.crossed_labels[label_count:]
+        if not labels:
+            return value
+        # The value is still valid if none of the crossed lines is a jump target, which is only known at the end
+        register = '%{}_{}'.format(variable, self.uid())
+        self.append_instruction(ForwardedLoad(register, scalar_ptr(variable), value, labels))
+        self.remember_variable(variable, register)
+        self.register_variables[register] = variable
+        return register
+
+    def remember_variable(self, variable, value):
+        self.loaded_variables[variable] = (value, len(self.crossed_labels))
+
+    def forget_variables(self, variables=None):
+        self.loaded_variables = variables or {}
+        self.crossed_labels = []
+        self.block_values = {}
 
 
 def to_int(identifier):
@@ -61,6 +130,89 @@ def dimensions_specifier(dimensions):
     return '[{} x {}]'.format(dimensions[0], dimensions_specifier(dimensions[1:]))
 
 
+def scalar_ptr(variable):
+    return ir.Pointer('double', '@{}'.format(variable), 8)
+
+
+def load_scalar(state, variable):
+    '''Return the value of a scalar variable, loading it unless it's known in a register.'''
+    value = state.variable_value(variable)
+    if value is None:
+        value = '%{}_{}'.format(variable, state.uid())
+        state.append_instruction(ir.Load(value, 'double', scalar_ptr(variable)))
+        state.remember_variable(variable, value)
+        state.register_variables[value] = variable
+    return value
+
+
+def integer_counter(state, value):
+    '''Return the context of the enclosing FOR loop with an i64 counter whose variable was loaded into value, if any.'''
+    variable = state.register_variables.get(value)
+    return next((x for x in state.for_context if x.variable == variable and x.counter), None)
+
+
+def index_register(state, value, type='i32'):
+    '''Convert an array index to an integer type, reusing a conversion of the same value in the current basic block.'''
+    register = state.block_values.get((value, type))
+    if register:
+        return register
+    register = '%fptoui_{}'.format(state.uid())
+    for_context = state.options.integer_indices and integer_counter(state, value)
+    if for_context:
+        counter = ir.Pointer('i64', '@{}'.format(for_context.counter), 8)
+        if type == 'i64':
+            integer_code = [ir.Load(register, 'i64', counter)]
+        else:
+            count = '{}_count'.format(register)
+            integer_code = [ir.Load(count, 'i64', counter), ir.Cast(register, 'trunc', 'i64', count, type)]
+        state.append_instruction(
+            IntegerCounterCode(for_context.variable, integer_code, [ir.Cast(register, 'fptoui', 'double', value, type)]))
+    else:
+        state.append_instruction(ir.Cast(register, 'fptoui', 'double', value, type))
+    state.block_values[(value, type)] = register
+    return register
+
+
+def heap_array_ptr(state, variable, dims):
+    '''Return a pointer to an element of a heap allocated array, stored flat in row-major order.'''
+    key = (variable, tuple(dims))
+    result = state.block_values.get(key)
+    if result:
+        return ir.Pointer('double', result, 8)
+    dimensions = [to_int(x) for x in state.variable_dimensions[variable]]
+    stride = 1
+    constant_offset = 0
+    offsets = []
+    for d, dimension in reversed(list(zip(dims, dimensions))):
+        if isinstance(d, float):
+            constant_offset += int(d) * stride
+        else:
+            offset = index_register(state, d, 'i64')
+            if stride != 1:
+                scaled_offset = '%offset_{}'.format(state.uid())
+                state.append_instruction(ir.BinaryOperator(scaled_offset, 'mul', offset, stride, type='i64', flags='nuw nsw'))
+                offset = scaled_offset
+            offsets.append(offset)
+        stride *= dimension
+    if constant_offset or not offsets:
+        offsets.append(constant_offset)
+    offset = offsets[0]
+    for x in offsets[1:]:
+        total = '%offset_{}'.format(state.uid())
+        state.append_instruction(ir.BinaryOperator(total, 'add', offset, x, type='i64', flags='nuw nsw'))
+        offset = total
+
+    base = state.block_values.get(variable)
+    if not base:
+        base = '%{}_base_{}'.format(variable, state.uid())
+        state.append_instruction(ir.Load(base, 'double*', ir.Pointer('double*', '@{}'.format(variable), 8)))
+        state.block_values[variable] = base
+    result = '%ptr_{}'.format(state.uid())
+    state.append_instruction(ir.OffsetPtr(result, 'double', base, offset))
+    state.block_values[key] = result
+    return ir.Pointer('double', result, 8)
+
+
 def get_variable_ptr(state, variable, dims):
     '''Return a pointer to a variable, indexed at dims.
 
@@ -70,7 +222,9 @@ def get_variable_ptr(state, variable, dims):
         raise SemanticError(
             'Variable dimensions mismatch for {} (expected {}, got {})'.format(variable, len(variable_dimensions), len(dims)))
     if not variable_dimensions:
-        return 'double* @{}, align 8'.format(variable)
+        return scalar_ptr(variable)
+    if variable in state.heap_arrays:
+        return heap_array_ptr(state, variable, dims)
     # Multidimensional, convert operands to int and call getelementptr
     ptr_index = []
     dims_is_constant_expression = True
@@ -80,36 +234,50 @@ def get_variable_ptr(state, variable, dims):
             ptr_index.append(int(d))
         else:
             # Convert expression result to int
-            register = '%fptoui_{}'.format(state.uid())
-            state.append_instruction('{} = fptoui double {} to i32'.format(register, d))
-            ptr_index.append(register)
+            ptr_index.append(index_register(state, d))
             dims_is_constant_expression = False
-    ptr_index = ', '.join('i32 {}'.format(x) for x in ptr_index)
-    getelementptr = 'getelementptr inbounds {dims}, {dims}* @{var}, i32 0, {index}'.format(
-        dims=dimensions_specifier(variable_dimensions),
-        var=variable,
-        index=ptr_index)
+    dimensions = dimensions_specifier(variable_dimensions)
+    address = '@{}'.format(variable)
     if dims_is_constant_expression:
-        result = getelementptr
+        result = ir.getelementptr(dimensions, address, ptr_index, constant=True)
     else:
-        result = '%ptr_{}'.format(state.uid())
-        state.append_instruction('{} = {}'.format(result, getelementptr))
-    return 'double* {}, align 16'.format(result)
+        key = (variable, tuple(ptr_index))
+        result = state.block_values.get(key)
+        if not result:
+            result = '%ptr_{}'.format(state.uid())
+            state.append_instruction(ir.GetElementPtr(result, dimensions, address, ptr_index))
+            state.block_values[key] = result
+    return ir.Pointer('double', result, 16)
 
 
 def assign_to(state, lvalue):
-    if ',' not in lvalue:
-        # If lvalue is just a variable name, add other qualifiers to make it a pointer
-        lvalue = 'double* @{}, align 8'.format(lvalue)
-    state.append_instruction('store double {}, {}'.format(state.exp_result, lvalue))
+    if not isinstance(lvalue, ir.Pointer):
+        # If lvalue is just a variable name, make it a pointer
+        state.remember_variable(lvalue, state.exp_result)
+        lvalue = scalar_ptr(lvalue)
+    state.append_instruction(ir.Store('double', state.exp_result, lvalue))
+
+
+# Maximum GOSUB nesting with an explicit return stack
+RETURN_STACK_DEPTH = 4096
+RETURN_STACK_POINTER = ir.Pointer('i32', '@return_stack_pointer', 4)
+# Maximum number of instructions of inlined DEF FN functions
+INLINE_FUNCTION_SIZE = 16
+
+
+def is_inlinable(instructions):
+    # Straight-line code only, without placeholders that depend on the rest of the program
+    return len(instructions) <= INLINE_FUNCTION_SIZE and all(
+        isinstance(x, ir.Instruction) and not isinstance(x, (ir.Label, ir.Comment)) and not x.is_terminator
+        for x in instructions)
 
 
 class LlvmIrGenerator:
-    def __init__(self, filename):
-        self.state = SemanticState(os.path.basename(filename))
+    def __init__(self, filename, options=CodegenOptions()):
+        self.state = SemanticState(os.path.basename(filename), options)
         self.state.current_function = Program()
         self.state.functions.extend((self.state.current_function, Main()))
-        self.exp = Exp(self.state)
+        self.exp = ExpTree(self.state) if options.expression_engine == 'tree' else Exp(self.state)
         self.if_statement = If(self.state)
         self.for_statement = For(self.state)
         self.print = Print(self.state)
@@ -118,16 +286,22 @@ class LlvmIrGenerator:
         identifier = to_int(identifier)
         if identifier in self.state.defined_labels:
             raise SemanticError('Duplicate label {}'.format(identifier))
-        label = 'label_{}'.format(identifier)
         if not self.state.entry_point:
             # First label is the entry point
             self.state.entry_point = identifier
         if self.state.for_context and not self.state.for_context[-1].identifier:
             self.state.for_context[-1].identifier = identifier
         self.state.defined_labels.add(identifier)
+        if self.state.options.promote_variables:
+            self.state.crossed_labels.append(identifier)
+            # The line may start a basic block
+            self.state.block_values = {}
+        else:
+            # Values are only reused within a line
+            self.state.forget_variables()
         if not is_block_terminator(self.state.current_function.instructions[-1]):
-            self.state.append_instruction(lambda state: ('br label %{}'.format(label) if identifier in state.goto_targets | state.gosub_targets else None))
-        self.state.append_instruction(lambda state: ('{}:'.format(label) if identifier in state.goto_targets | state.gosub_targets | {state.entry_point} else None))
+            self.state.append_instruction(LabelBranch(identifier))
+        self.state.append_instruction(LabelDefinition(identifier))
 
     def lvalue(self, variable):
         variable = variable.upper()
@@ -142,18 +316,24 @@ class LlvmIrGenerator:
         self.lvalue_ptr = get_variable_ptr(self.state, self.lvalue_variable, self.lvalue_dimensions)
 
     def let_rvalue(self):
-        assign_to(self.state, self.lvalue_ptr)
+        if not self.lvalue_dimensions:
+            self.state.assigned_variables.add(self.lvalue_variable)
+        assign_to(self.state, self.lvalue_variable if not self.lvalue_dimensions else self.lvalue_ptr)
 
     def read_item(self):
         self.state.has_read = True
         i = self.state.uid()
-        self.state.append_instruction('%i_{} = load i32, i32* @data_index, align 4'.format(i))
-        self.state.append_instruction(lambda state:
-            '%tmp_{i} = getelementptr [{len} x double], [{len} x double]* @DATA, i32 0, i32 %i_{i}'.format(len=len(state.const_data), i=i))
-        self.state.append_instruction('%data_value_{i} = load double, double* %tmp_{i}, align 16'.format(i=i))
-        self.state.append_instruction('store double %data_value_{}, {}'.format(i, self.lvalue_ptr))
-        self.state.append_instruction('%i_{i}_inc = add i32 %i_{i}, 1'.format(i=i))
-        self.state.append_instruction('store i32 %i_{}_inc, i32* @data_index, align 4'.format(i))
+        data_index = ir.Pointer('i32', '@data_index', 4)
+        self.state.append_instruction(ir.Load('%i_{}'.format(i), 'i32', data_index))
+        self.state.append_instruction(DataElementPtr('%tmp_{}'.format(i), '%i_{}'.format(i)))
+        self.state.append_instruction(
+            ir.Load('%data_value_{}'.format(i), 'double', ir.Pointer('double', '%tmp_{}'.format(i), 16)))
+        self.state.append_instruction(ir.Store('double', '%data_value_{}'.format(i), self.lvalue_ptr))
+        if not self.lvalue_dimensions:
+            self.state.assigned_variables.add(self.lvalue_variable)
+            self.state.remember_variable(self.lvalue_variable, '%data_value_{}'.format(i))
+        self.state.append_instruction(ir.BinaryOperator('%i_{}_inc'.format(i), 'add', '%i_{}'.format(i), 1, type='i32', flags=None))
+        self.state.append_instruction(ir.Store('i32', '%i_{}_inc'.format(i), data_index))
 
     def data_item(self, value):
         try:
@@ -161,52 +341,149 @@ class LlvmIrGenerator:
         except ValueError:
             raise SemanticError('{} is not a valid number'.format(value))
 
+    def negative_data_item(self, value):
+        self.data_item('-{}'.format(value))
+
     def goto(self, target):
         target = to_int(target)
         self.state.goto_targets.add(target)
-        self.state.append_instruction('br label %label_{}'.format(target))
+        self.state.append_instruction(ir.Br('label_{}'.format(target)))
+        self.state.forget_variables()
 
     def dim_dimension(self, dimension):
-        self.lvalue_dimensions.append(dimension)
+        # Subscripts range from 0 to the declared bound, inclusive
+        self.lvalue_dimensions.append(to_int(dimension) + 1)
 
     def dim_end(self):
         self.state.variables.add(self.lvalue_variable)
         self.state.variable_dimensions[self.lvalue_variable] = self.lvalue_dimensions
+        threshold = self.state.options.heap_array_threshold
+        if threshold is not None:
+            size = 1
+            for x in self.lvalue_dimensions:
+                size *= to_int(x)
+            if size * 8 > threshold:
+                self.state.heap_arrays[self.lvalue_variable] = size
+                self.state.external_symbols.update(('calloc', 'exit', 'write'))
+                self.state.heap_error_message = self.state.intern_string('Not enough memory for DIM arrays\\0A')
 
     def def_identifier(self, identifier):
         f = Function(identifier, return_type='double', arguments='double %arg')
         self.state.functions.append(f)
         self.state.current_function = f
+        self.state.forget_variables()
 
     def def_parameter(self, variable):
-        self.state.loaded_variables = {variable.upper(): '%arg'}
+        self.state.forget_variables({variable.upper(): ('%arg', 0)})
 
     def def_exp(self, exp):
-        self.state.loaded_variables = {}
-        self.state.append_instruction('ret double {}'.format(self.state.exp_result))
+        self.state.forget_variables()
+        function = self.state.current_function
+        if self.state.options.inline_functions and is_inlinable(function.instructions):
+            self.state.inline_functions[function.name] = (list(function.instructions), self.state.exp_result)
+        self.state.append_instruction(ir.Ret('double', self.state.exp_result))
         self.state.current_function = self.state.functions[0]
 
+    def declare_return_stack(self):
+        if not self.state.has_return_stack:
+            self.state.has_return_stack = True
+            self.state.private_globals.append('@return_stack = internal global [{} x i32] zeroinitializer, align 16'
+                                              .format(RETURN_STACK_DEPTH))
+            # The bottom of the stack holds return address 0, so that RETURN outside of subroutines ends the program
+            self.state.private_globals.append('@return_stack_pointer = internal global i32 1, align 4')
+
     def gosub(self, target):
         target = to_int(target)
         self.state.gosub_targets.add(target)
-        self.state.append_instruction('tail call void @program(i8* blockaddress(@program, %label_{})) #0'.format(target))
+        if self.state.options.gosub_return_stack:
+            self.push_return_address(target)
+        else:
+            self.state.append_instruction(
+                ir.Call(None, 'void', 'program', ['i8* blockaddress(@program, %label_{})'.format(target)]))
+        # The subroutine may change any variable
+        self.state.forget_variables()
+
+    def push_return_address(self, target):
+        self.declare_return_stack()
+        self.state.return_addresses += 1
+        return_address = self.state.return_addresses
+        i = self.state.uid()
+        stack_pointer = '%return_stack_pointer_{}'.format(i)
+        is_full = '%return_stack_full_{}'.format(i)
+        slot = '%return_stack_slot_{}'.format(i)
+        for instruction in (
+                ir.Load(stack_pointer, 'i32', RETURN_STACK_POINTER),
+                # Slot 0 holds return address 0, so at most RETURN_STACK_DEPTH - 1 GOSUB statements can be nested
+                ir.ICmp(is_full, 'uge', 'i32', stack_pointer, RETURN_STACK_DEPTH),
+                ir.CondBr(is_full, 'return_stack_overflow', 'gosub_{}'.format(i))):
+            self.state.append_instruction(instruction)
+        if not self.state.has_return_stack_overflow:
+            # All GOSUB statements branch to this block, emitted where the first of them is
+            self.state.has_return_stack_overflow = True
+            self.state.external_symbols.update(('exit', 'write'))
+            identifier, length = self.state.intern_string('GOSUB nested too deep\\0A')
+            message = 'i8* {}'.format(ir.getelementptr('[{} x i8]'.format(length), identifier, [0], constant=True))
+            for instruction in (
+                    ir.Label('return_stack_overflow'),
+                    FlushOutput(),
+                    ir.Call(None, 'i64', 'write', ['i32 2', message, 'i64 {}'.format(length - 1)]),
+                    ir.Call(None, 'void', 'exit', ['i32 1'], attributes='noreturn #0'),
+                    ir.Unreachable()):
+                self.state.append_instruction(instruction)
+        for instruction in (
+                ir.Label('gosub_{}'.format(i)),
+                ir.GetElementPtr(slot, '[{} x i32]'.format(RETURN_STACK_DEPTH), '@return_stack', [stack_pointer]),
+                ir.Store('i32', return_address, ir.Pointer('i32', slot, 4)),
+                ir.BinaryOperator('{}_inc'.format(stack_pointer), 'add', stack_pointer, 1, type='i32', flags='nuw nsw'),
+                ir.Store('i32', '{}_inc'.format(stack_pointer), RETURN_STACK_POINTER),
+                ir.Br('label_{}'.format(target)),
+                ir.Label('gosub_return_{}'.format(return_address))):
+            self.state.append_instruction(instruction)
 
     def return_statement(self, token):
-        self.state.append_instruction('ret void')
+        if self.state.options.gosub_return_stack:
+            self.pop_return_address()
+        self.state.append_instruction(ir.Ret())
+        self.state.forget_variables()
+
+    def pop_return_address(self):
+        self.declare_return_stack()
+        i = self.state.uid()
+        stack_pointer = '%return_stack_pointer_{}'.format(i)
+        slot = '%return_stack_slot_{}'.format(i)
+        return_address = '%return_address_{}'.format(i)
+        for instruction in (
+                ir.Load(stack_pointer, 'i32', RETURN_STACK_POINTER),
+                ir.BinaryOperator('{}_dec'.format(stack_pointer), 'sub', stack_pointer, 1, type='i32', flags='nuw nsw'),
+                ir.Store('i32', '{}_dec'.format(stack_pointer), RETURN_STACK_POINTER),
+                ir.GetElementPtr(slot, '[{} x i32]'.format(RETURN_STACK_DEPTH), '@return_stack',
+                                 ['{}_dec'.format(stack_pointer)]),
+                ir.Load(return_address, 'i32', ir.Pointer('i32', slot, 4)),
+                # Return address 0 (and anything not pushed by GOSUB) returns to main
+                ReturnDispatch(return_address, 'return_to_main_{}'.format(i)),
+                ir.Label('return_to_main_{}'.format(i))):
+            self.state.append_instruction(instruction)
 
     def remark(self, text):
-        self.state.append_instruction(';{}'.format(text[3:]))
+        self.state.append_instruction(ir.Comment(text[3:]))
 
     def end(self, event):
         self.state.external_symbols.add('exit')
-        self.state.append_instruction('tail call void @exit(i32 0) noreturn #0')
-        self.state.append_instruction('unreachable')
+        self.state.append_instruction(FlushOutput())
+        self.state.append_instruction(ir.Call(None, 'void', 'exit', ['i32 0'], attributes='noreturn #0'))
+        self.state.append_instruction(ir.Unreachable())
+        self.state.forget_variables()
 
     def external_symbols_declarations(self):
         DECLARATIONS = {
+            'calloc': 'declare noalias i8* @calloc(i64, i64) local_unnamed_addr #0',
             'exit': 'declare void @exit(i32) local_unnamed_addr noreturn #0',
             'printf': 'declare i32 @printf(i8* nocapture readonly, ...) local_unnamed_addr #0',
             'putchar': 'declare i32 @putchar(i32) local_unnamed_addr #0',
+            'snprintf': 'declare i32 @snprintf(i8* nocapture, i64, i8* nocapture readonly, ...) local_unnamed_addr nounwind',
+            'write': 'declare i64 @write(i32, i8* nocapture readonly, i64) local_unnamed_addr nounwind',
+            'llvm.memcpy.p0i8.p0i8.i64':
+                'declare void @llvm.memcpy.p0i8.p0i8.i64(i8* nocapture writeonly, i8* nocapture readonly, i64, i1 immarg)',
 
             # Language built-ins
             'llvm.sin.f64': 'declare double @llvm.sin.f64(double) local_unnamed_addr #0',
@@ -215,6 +492,7 @@ class LlvmIrGenerator:
             'atan': 'declare double @atan(double) local_unnamed_addr #0',
             'llvm.exp.f64': 'declare double @llvm.exp.f64(double) local_unnamed_addr #0',
             'llvm.abs.f64': 'declare double @llvm.abs.f64(double) local_unnamed_addr #0',
+            'llvm.fabs.f64': 'declare double @llvm.fabs.f64(double) local_unnamed_addr #0',
             'llvm.log.f64': 'declare double @llvm.log.f64(double) local_unnamed_addr #0',
             'llvm.sqrt.f64': 'declare double @llvm.sqrt.f64(double) local_unnamed_addr #0',
             'llvm.rint.f64': 'declare double @llvm.rint.f64(double) local_unnamed_addr #0',
@@ -223,7 +501,15 @@ class LlvmIrGenerator:
         }
         return [DECLARATIONS[x] for x in sorted(self.state.external_symbols)]
 
-    def to_ll(self):
+    def to_ll(self, output=None):
+        '''Write the LLVM IR module to output, a text stream, one function at a time.
+
+        If output is None, return the module as a string.'''
+        if output is None:
+            with io.StringIO() as f:
+                self.to_ll(f)
+                return f.getvalue()
+
         defined_functions = {x.name for x in self.state.functions}
         undefined_functions = self.state.referenced_functions - defined_functions
         if undefined_functions:
@@ -246,20 +532,34 @@ class LlvmIrGenerator:
             if not dimensions:
                 # Scalar
                 return '@{} = internal global double 0., align 8'.format(var)
+            if var in self.state.heap_arrays:
+                # Pointer to the array, allocated when the program starts
+                return '@{} = internal global double* null, align 8'.format(var)
 
             return '@{} = internal global {} zeroinitializer, align 16'.format(var, dimensions_specifier(dimensions))
 
-        header = [
-            'source_filename = "{}"\ntarget triple = "x86_64-pc-linux-gnu"'.format(self.state.filename),
-            '\n'.join((x for x in sorted(self.state.private_globals))),
-            '\n'.join((declare_variable(x) for x in sorted(self.state.variables))),
-        ]
-
-        body = [x.to_ll(self.state) for x in self.state.functions]
-
-        return '\n\n'.join((x for x in (
-            *header,
-            *body,
-            '\n'.join(self.external_symbols_declarations()),
-            LLVM_TAIL,
-        ) if x))
+        is_first_section = True
+
+        def write_section(section):
+            # Non-empty sections are separated by an empty line
+            nonlocal is_first_section
+            if not section:
+                return
+            if not is_first_section:
+                output.write('\n\n')
+            output.write(section)
+            is_first_section = False
+
+        write_section('source_filename = "{}"\ntarget triple = "x86_64-pc-linux-gnu"'.format(self.state.filename))
+        string_constants = ('{} = private unnamed_addr constant [{} x i8] c"{}\\00", align 1'.format(identifier, length, literal)
+                            for literal, (identifier, length) in self.state.string_constants.items())
+        write_section('\n'.join(itertools.chain(string_constants, sorted(self.state.private_globals))))
+        write_section('\n'.join((declare_variable(x) for x in sorted(self.state.variables))))
+        resolution = Resolution(self.state)
+        for function in self.state.functions:
+            write_section(function.to_ll(self.state, resolution))
+        if self.state.has_buffered_output:
+            write_section(PRINT_RUNTIME)
+        # Declarations are written last, since finalizing functions may reference external symbols
+        write_section('\n'.join(self.external_symbols_declarations()))
+        write_section(LLVM_TAIL)
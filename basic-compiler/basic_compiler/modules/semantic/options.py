@@ -0,0 +1,21 @@
+from collections import namedtuple
+
+# Code generation options:
+#  promote_variables: keep the values of scalar variables in registers across lines of a basic block, instead of
+#   reloading them (they are always reused within a line)
+#  integer_indices: index arrays with the i64 counter of enclosing FOR loops, instead of converting the double counter
+#  heap_array_threshold: arrays larger than this many bytes are allocated with calloc at program start, instead of
+#   being zero-initialized globals (None to disable)
+#  buffered_print: PRINT appends to an output buffer of the program runtime, written when full and at exit, instead of
+#   calling printf for each statement
+#  gosub_return_stack: GOSUB pushes a return address to an explicit stack and branches to the subroutine, and RETURN
+#   dispatches on the popped address with a switch, instead of calling the program function recursively
+#  inline_functions: replace calls to small DEF FN functions defined earlier in the program by a copy of their code
+#  expression_engine: 'queue' compiles expressions while they're recognized, with operator and operand queues. 'tree'
+#   collects the tokens of each expression, parses them to a tree by precedence climbing and compiles the tree, reusing
+#   the results of repeated subexpressions
+EXPRESSION_ENGINES = ('queue', 'tree')
+CodegenOptions = namedtuple('CodegenOptions',
+                            ['promote_variables', 'integer_indices', 'heap_array_threshold', 'buffered_print',
+                             'gosub_return_stack', 'inline_functions', 'expression_engine'],
+                            defaults=[False, False, None, False, False, False, 'queue'])
@@ -0,0 +1,175 @@
+'''Instructions that depend on the whole program, resolved after all code is generated.'''
+from basic_compiler.modules.semantic import ir
+
+
+class Resolution:
+    '''Program-wide facts needed by placeholders, computed once when the module is written.'''
+    def __init__(self, state):
+        self.entry_point = state.entry_point
+        self.referenced_labels = state.goto_targets | state.gosub_targets
+        self.defined_labels = self.referenced_labels | {state.entry_point}
+        if state.options.gosub_return_stack:
+            # Subroutines are entered by branches, so the program function is only called by main
+            self.call_targets = {state.entry_point} if state.entry_point else set()
+        elif state.entry_point:
+            self.call_targets = state.gosub_targets | {state.entry_point}
+        else:
+            self.call_targets = state.gosub_targets
+        self.data_length = len(state.const_data)
+        self.assigned_variables = state.assigned_variables
+        self.heap_arrays = state.heap_arrays
+        self.heap_error_message = state.heap_error_message
+        self.has_buffered_output = state.has_buffered_output
+        self.return_addresses = state.return_addresses
+
+
+class Placeholder:
+    __slots__ = ()
+
+    def resolve(self, resolution):
+        '''Return the instruction replacing this placeholder, a list of instructions, or None to omit it.'''
+        raise NotImplementedError()
+
+
+class LabelBranch(Placeholder):
+    '''Fall-through branch into a numbered line, needed only if the line starts a basic block.'''
+    __slots__ = ('identifier',)
+
+    def __init__(self, identifier):
+        self.identifier = identifier
+
+    def resolve(self, resolution):
+        if self.identifier in resolution.referenced_labels:
+            return ir.Br('label_{}'.format(self.identifier))
+
+
+class LabelDefinition(Placeholder):
+    __slots__ = ('identifier',)
+
+    def __init__(self, identifier):
+        self.identifier = identifier
+
+    def resolve(self, resolution):
+        if self.identifier in resolution.defined_labels:
+            return ir.Label('label_{}'.format(self.identifier))
+
+
+class DataElementPtr(Placeholder):
+    '''Pointer to an element of the DATA array, whose length is only known at the end of the program.'''
+    __slots__ = ('result', 'index')
+
+    def __init__(self, result, index):
+        self.result = result
+        self.index = index
+
+    def resolve(self, resolution):
+        return ir.GetElementPtr(self.result, '[{} x double]'.format(resolution.data_length), '@DATA', [self.index],
+                                inbounds=False)
+
+
+class ForwardedLoad(Placeholder):
+    '''Load of a variable whose value is known in a register, unless one of the lines in between starts a basic block.'''
+    __slots__ = ('result', 'pointer', 'value', 'labels')
+
+    def __init__(self, result, pointer, value, labels):
+        self.result = result
+        self.pointer = pointer
+        self.value = value
+        self.labels = labels
+
+    def resolve(self, resolution):
+        if any(x in resolution.defined_labels for x in self.labels):
+            return ir.Load(self.result, 'double', self.pointer)
+        # Copy the known value (bitcast to the same type is a no-op)
+        return ir.Cast(self.result, 'bitcast', 'double', self.value, 'double')
+
+
+class IntegerCounterCode(Placeholder):
+    '''Code of a FOR loop using an integer counter, replaced by fallback code if the counter variable is assigned by
+    other statements.'''
+    __slots__ = ('variable', 'instructions', 'fallback')
+
+    def __init__(self, variable, instructions, fallback):
+        self.variable = variable
+        self.instructions = instructions
+        self.fallback = fallback
+
+    def resolve(self, resolution):
+        if self.variable in resolution.assigned_variables:
+            return self.fallback
+        return self.instructions
+
+
+class HeapArrayAllocations(Placeholder):
+    '''Allocation of arrays on the heap, before the program starts.'''
+    __slots__ = ()
+
+    def resolve(self, resolution):
+        if not resolution.heap_arrays:
+            return None
+        instructions = []
+        for variable, size in sorted(resolution.heap_arrays.items()):
+            memory = '%{}_memory'.format(variable)
+            failed = '%{}_allocation_failed'.format(variable)
+            array = '%{}_array'.format(variable)
+            instructions.extend((
+                # calloc returns zeroed memory, lazily mapped by the OS for large sizes
+                ir.Call(memory, 'noalias i8*', 'calloc', ['i64 {}'.format(size), 'i64 8']),
+                ir.ICmp(failed, 'eq', 'i8*', memory, 'null'),
+                ir.CondBr(failed, 'heap_allocation_failed', '{}_allocated'.format(variable)),
+                ir.Label('{}_allocated'.format(variable)),
+                ir.Cast(array, 'bitcast', 'i8*', memory, 'double*'),
+                ir.Store('double*', array, ir.Pointer('double*', '@{}'.format(variable), 8)),
+            ))
+        identifier, length = resolution.heap_error_message
+        message = 'i8* {}'.format(ir.getelementptr('[{} x i8]'.format(length), identifier, [0], constant=True))
+        instructions.extend((
+            ir.Br('heap_allocated'),
+            # Print an error to stderr and exit, the program hasn't started (so there's no buffered output)
+            ir.Label('heap_allocation_failed'),
+            ir.Call(None, 'i64', 'write', ['i32 2', message, 'i64 {}'.format(length - 1)]),
+            ir.Call(None, 'void', 'exit', ['i32 1'], attributes='noreturn #0'),
+            ir.Unreachable(),
+            ir.Label('heap_allocated'),
+        ))
+        return instructions
+
+
+class FlushOutput(Placeholder):
+    '''Write of the PRINT buffer before the program exits, if the program has buffered output.'''
+    __slots__ = ()
+
+    def resolve(self, resolution):
+        if resolution.has_buffered_output:
+            return ir.Call(None, 'void', 'print_flush', [])
+
+
+class ReturnDispatch(Placeholder):
+    '''Branch of RETURN to the statement after the GOSUB that pushed a return address. All GOSUB statements of the
+    program must be known.'''
+    __slots__ = ('return_address', 'default')
+
+    def __init__(self, return_address, default):
+        self.return_address = return_address
+        self.default = default
+
+    def resolve(self, resolution):
+        return ir.Switch('i32', self.return_address, self.default,
+                         [(x, 'gosub_return_{}'.format(x)) for x in range(1, resolution.return_addresses + 1)])
+
+
+class EntryPointCall(Placeholder):
+    __slots__ = ()
+
+    def resolve(self, resolution):
+        if resolution.entry_point:
+            return ir.Call(None, 'void', 'program', ['i8* blockaddress(@program, %label_{})'.format(resolution.entry_point)])
+
+
+class CallTargetBranch(Placeholder):
+    '''Indirect branch to the line called by GOSUB (or to the entry point, when called from main).'''
+    __slots__ = ()
+
+    def resolve(self, resolution):
+        if resolution.call_targets:
+            return ir.IndirectBr('%target_label', ['label_{}'.format(x) for x in resolution.call_targets])
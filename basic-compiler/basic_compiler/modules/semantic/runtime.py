@@ -0,0 +1,156 @@
+'''Runtime support emitted into programs compiled with buffered PRINT.
+
+PRINT statements append to a large buffer, which is written to the standard output with a single write() when it's full
+and before the program exits. Numbers are formatted like printf's %f, with a fast path for numbers whose digits can be
+computed exactly with 64-bit integers and snprintf for everything else.'''
+
+PRINT_BUFFER_SIZE = 1 << 16
+# Maximum length of a formatted number (the largest double has 309 integer digits)
+MAX_NUMBER_LENGTH = 512
+
+# Functions and intrinsics called by the runtime
+EXTERNAL_SYMBOLS = {'write', 'snprintf', 'llvm.memcpy.p0i8.p0i8.i64', 'llvm.fabs.f64', 'llvm.rint.f64'}
+
+# The runtime doesn't use fast-math flags or attributes, since it must handle infinities and NaNs
+PRINT_RUNTIME = '''@print_buffer = internal global [{size} x i8] zeroinitializer, align 16
+@print_buffer_length = internal global i64 0, align 8
+@.print_double_format = private unnamed_addr constant [3 x i8] c"%f\\00", align 1
+
+define internal void @print_flush() nounwind {{
+entry:
+  %length = load i64, i64* @print_buffer_length, align 8
+  store i64 0, i64* @print_buffer_length, align 8
+  br label %loop
+loop:
+  %offset = phi i64 [ 0, %entry ], [ %next_offset, %write ]
+  %remaining = sub i64 %length, %offset
+  %done = icmp sle i64 %remaining, 0
+  br i1 %done, label %exit, label %write
+write:
+  %data = getelementptr inbounds [{size} x i8], [{size} x i8]* @print_buffer, i64 0, i64 %offset
+  %written = call i64 @write(i32 1, i8* %data, i64 %remaining)
+  %failed = icmp slt i64 %written, 1
+  %next_offset = add i64 %offset, %written
+  br i1 %failed, label %exit, label %loop
+exit:
+  ret void
+}}
+
+; Reserve length bytes at the end of the buffer, flushing it if needed. length must not exceed the buffer size
+define internal i8* @print_reserve(i64 %length) nounwind {{
+entry:
+  %used = load i64, i64* @print_buffer_length, align 8
+  %total = add i64 %used, %length
+  %fits = icmp ule i64 %total, {size}
+  br i1 %fits, label %reserve, label %flush
+flush:
+  call void @print_flush()
+  br label %reserve
+reserve:
+  %start = phi i64 [ %used, %entry ], [ 0, %flush ]
+  %data = getelementptr inbounds [{size} x i8], [{size} x i8]* @print_buffer, i64 0, i64 %start
+  ret i8* %data
+}}
+
+define internal void @print_commit(i8* %end) nounwind {{
+entry:
+  %buffer = getelementptr inbounds [{size} x i8], [{size} x i8]* @print_buffer, i64 0, i64 0
+  %end_address = ptrtoint i8* %end to i64
+  %buffer_address = ptrtoint i8* %buffer to i64
+  %length = sub i64 %end_address, %buffer_address
+  store i64 %length, i64* @print_buffer_length, align 8
+  ret void
+}}
+
+define internal void @print_char(i8 %c) nounwind {{
+entry:
+  %data = call i8* @print_reserve(i64 1)
+  store i8 %c, i8* %data, align 1
+  %end = getelementptr inbounds i8, i8* %data, i64 1
+  call void @print_commit(i8* %end)
+  ret void
+}}
+
+define internal void @print_bytes(i8* %bytes, i64 %length) nounwind {{
+entry:
+  %data = call i8* @print_reserve(i64 %length)
+  call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %data, i8* align 1 %bytes, i64 %length, i1 false)
+  %end = getelementptr inbounds i8, i8* %data, i64 %length
+  call void @print_commit(i8* %end)
+  ret void
+}}
+
+define internal void @print_double(double %x) nounwind {{
+entry:
+  %digits = alloca [32 x i8], align 16
+  %data = call i8* @print_reserve(i64 {max_number_length})
+  %bits = bitcast double %x to i64
+  %negative = icmp slt i64 %bits, 0
+  %magnitude = call double @llvm.fabs.f64(double %x)
+  ; Below 2^31, the number scaled by 10^6 fits exactly in the 53 bits of the mantissa
+  %small = fcmp olt double %magnitude, 2147483648.0
+  br i1 %small, label %scale, label %slow
+scale:
+  %scaled = fmul double %magnitude, 1000000.0
+  %rounded = call double @llvm.rint.f64(double %scaled)
+  ; The product has an error of at most half an ulp (2^-53 relative), so it's rounded like the exact value unless it's
+  ; too close to a tie. Those are left to snprintf
+  %fraction = fsub double %scaled, %rounded
+  %fraction_magnitude = call double @llvm.fabs.f64(double %fraction)
+  %tie_distance = fsub double 0.5, %fraction_magnitude
+  %tolerance = fmul double %scaled, 0x3CD0000000000000
+  %near_tie = fcmp ole double %tie_distance, %tolerance
+  br i1 %near_tie, label %slow, label %fast
+fast:
+  %value = fptoui double %rounded to i64
+  %integer = udiv i64 %value, 1000000
+  %decimals = urem i64 %value, 1000000
+  %point = getelementptr inbounds [32 x i8], [32 x i8]* %digits, i64 0, i64 25
+  store i8 46, i8* %point, align 1
+  br label %decimal_digit
+decimal_digit:
+  ; Digits are written backwards, from the end of the digits array
+  %decimal_position = phi i64 [ 31, %fast ], [ %next_decimal_position, %decimal_digit ]
+  %decimal_value = phi i64 [ %decimals, %fast ], [ %next_decimal_value, %decimal_digit ]
+  %decimal_remainder = urem i64 %decimal_value, 10
+  %decimal_byte = trunc i64 %decimal_remainder to i8
+  %decimal_char = add i8 %decimal_byte, 48
+  %decimal_ptr = getelementptr inbounds [32 x i8], [32 x i8]* %digits, i64 0, i64 %decimal_position
+  store i8 %decimal_char, i8* %decimal_ptr, align 1
+  %next_decimal_value = udiv i64 %decimal_value, 10
+  %next_decimal_position = sub i64 %decimal_position, 1
+  %decimals_done = icmp eq i64 %next_decimal_position, 25
+  br i1 %decimals_done, label %integer_digit, label %decimal_digit
+integer_digit:
+  %integer_position = phi i64 [ 24, %decimal_digit ], [ %next_integer_position, %integer_digit ]
+  %integer_value = phi i64 [ %integer, %decimal_digit ], [ %next_integer_value, %integer_digit ]
+  %integer_remainder = urem i64 %integer_value, 10
+  %integer_byte = trunc i64 %integer_remainder to i8
+  %integer_char = add i8 %integer_byte, 48
+  %integer_ptr = getelementptr inbounds [32 x i8], [32 x i8]* %digits, i64 0, i64 %integer_position
+  store i8 %integer_char, i8* %integer_ptr, align 1
+  %next_integer_value = udiv i64 %integer_value, 10
+  %next_integer_position = sub i64 %integer_position, 1
+  %integer_done = icmp eq i64 %next_integer_value, 0
+  br i1 %integer_done, label %copy, label %integer_digit
+copy:
+  ; The sign is always stored, and overwritten by the digits if the number is positive
+  store i8 45, i8* %data, align 1
+  %sign_length = zext i1 %negative to i64
+  %destination = getelementptr inbounds i8, i8* %data, i64 %sign_length
+  %first_digit = getelementptr inbounds [32 x i8], [32 x i8]* %digits, i64 0, i64 %integer_position
+  %digits_length = sub i64 32, %integer_position
+  call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %destination, i8* align 1 %first_digit, i64 %digits_length, i1 false)
+  %fast_end = getelementptr inbounds i8, i8* %destination, i64 %digits_length
+  br label %done
+slow:
+  %format = getelementptr inbounds [3 x i8], [3 x i8]* @.print_double_format, i64 0, i64 0
+  %formatted_length = call i32 (i8*, i64, i8*, ...) @snprintf(i8* %data, i64 {max_number_length}, i8* %format, double %x)
+  %slow_length = sext i32 %formatted_length to i64
+  %slow_end = getelementptr inbounds i8, i8* %data, i64 %slow_length
+  br label %done
+done:
+  %end = phi i8* [ %fast_end, %copy ], [ %slow_end, %slow ]
+  call void @print_commit(i8* %end)
+  ret void
+}}'''.format(size=PRINT_BUFFER_SIZE, max_number_length=MAX_NUMBER_LENGTH)
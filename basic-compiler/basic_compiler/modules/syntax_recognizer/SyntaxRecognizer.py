@@ -1,258 +1,300 @@
-from basic_compiler.fsm import Fsm, State, Transition
+import sys
+
+from basic_compiler.fsm import bind_actions, compile_states, Fsm, State, Transition
 from basic_compiler.modules.EventDrivenModule import EventDrivenModule
 from basic_compiler.modules.semantic.llvm import LlvmIrGenerator
+from basic_compiler.modules.semantic.options import CodegenOptions
 
 
 class CompilerSyntaxError(RuntimeError):
     pass
 
 
-class SyntaxRecognizer(EventDrivenModule):
-    def open_handler(self, event):
-        self.ir_generator = LlvmIrGenerator(event[0])
-        exp_fsm = Fsm({})
-        exp_fsm.states = {
-            'start': State(None, [
-                Transition(('special', '+'), 'start'),
-                Transition(('special', '-'), 'start', self.ir_generator.exp.negative_expression),
-                Transition(None, 'start_expression'),
-            ]),
-            'start_expression': State(None, [
-                Transition(('special', '('), 'nested_expression', self.ir_generator.exp.operator),
-                Transition('number', 'end_expression', self.ir_generator.exp.number),
-                Transition('variable', 'end_of_variable', self.ir_generator.exp.variable),
-                Transition('identifier', 'function_call', self.ir_generator.exp.operator),
-            ]),
-            'nested_expression': State(None, [
-                Transition(exp_fsm, 'end_of_nested_expression', self.ir_generator.exp.end_nested_expression),
-            ]),
+def all_transitions(states):
+    '''Transitions of states and of the sub-FSMs they call.'''
+    seen = set()
+    pending = [states]
+    while pending:
+        for state in pending.pop().values():
+            for transition in state.transitions:
+                yield transition
+                if isinstance(transition.event, Fsm) and id(transition.event) not in seen:
+                    seen.add(id(transition.event))
+                    pending.append(transition.event.states)
 
-            'end_of_variable': State(None, [
-                Transition(('special', '('), 'variable_dimension'),
-                Transition(None, 'end_expression', self.ir_generator.exp.end_of_variable),
-            ]),
-            'variable_dimension': State(None, [
-                Transition(exp_fsm, 'end_of_dimension', self.ir_generator.exp.variable_dimension),
-            ]),
-            'end_of_dimension': State(None, [
-                Transition(('special', ','), 'variable_dimension'),
-                Transition(('special', ')'), 'end_expression', self.ir_generator.exp.end_of_variable),
-            ]),
 
-            'end_of_nested_expression': State(None, [
-                Transition(('special', ')'), 'end_expression'),
-            ]),
-            'function_call': State(None, [
-                Transition(('special', '('), 'nested_expression', self.ir_generator.exp.operator),
-            ]),
+def build_grammar():
+    '''States of the statement FSM. Semantic actions are names of LlvmIrGenerator methods (print.string is
+    ir_generator.print.string), or of SyntaxRecognizer methods (write_ir), bound for each file.'''
+    exp_fsm = Fsm({})
+    exp_fsm.states = {
+        'start': State(None, [
+            Transition(('special', '+'), 'start'),
+            Transition(('special', '-'), 'start', 'exp.negative_expression'),
+            Transition(None, 'start_expression'),
+        ]),
+        'start_expression': State(None, [
+            Transition(('special', '('), 'nested_expression', 'exp.operator'),
+            Transition('number', 'end_expression', 'exp.number'),
+            Transition('variable', 'end_of_variable', 'exp.variable'),
+            Transition('identifier', 'function_call', 'exp.operator'),
+        ]),
+        'nested_expression': State(None, [
+            Transition(exp_fsm, 'end_of_nested_expression', 'exp.end_nested_expression'),
+        ]),
 
-            'end_expression': State(None, [
-                Transition(('special', '+'), 'start_expression', self.ir_generator.exp.operator),
-                Transition(('special', '-'), 'start_expression', self.ir_generator.exp.operator),
-                Transition(('special', '*'), 'start_expression', self.ir_generator.exp.operator),
-                Transition(('special', '/'), 'start_expression', self.ir_generator.exp.operator),
-                Transition(('special', '↑'), 'start_expression', self.ir_generator.exp.operator),
-                Transition(None, 'accept', self.ir_generator.exp.end_expression),
-            ]),
-            'accept': State(True)
-        }
+        'end_of_variable': State(None, [
+            Transition(('special', '('), 'variable_dimension', 'exp.start_dimension'),
+            Transition(None, 'end_expression', 'exp.end_of_variable'),
+        ]),
+        'variable_dimension': State(None, [
+            Transition(exp_fsm, 'end_of_dimension', 'exp.variable_dimension'),
+        ]),
+        'end_of_dimension': State(None, [
+            Transition(('special', ','), 'variable_dimension'),
+            Transition(('special', ')'), 'end_expression', 'exp.end_of_array_variable'),
+        ]),
+
+        'end_of_nested_expression': State(None, [
+            Transition(('special', ')'), 'end_expression'),
+        ]),
+        'function_call': State(None, [
+            Transition(('special', '('), 'nested_expression', 'exp.operator'),
+        ]),
+
+        'end_expression': State(None, [
+            Transition(('special', '+'), 'start_expression', 'exp.operator'),
+            Transition(('special', '-'), 'start_expression', 'exp.operator'),
+            Transition(('special', '*'), 'start_expression', 'exp.operator'),
+            Transition(('special', '/'), 'start_expression', 'exp.operator'),
+            Transition(('special', '↑'), 'start_expression', 'exp.operator'),
+            Transition(None, 'accept', 'exp.end_expression'),
+        ]),
+        'accept': State(True)
+    }
+
+    states = {
+        'start': State(None, [
+            Transition('end_of_line', 'start'),
+            Transition('number', 'statement', 'label'),
+            Transition('eof', 'eof', 'write_ir'),
+        ]),
 
-        self.fsm = Fsm({
-            'start': State(None, [
-                Transition('end_of_line', 'start'),
-                Transition('number', 'statement', self.ir_generator.label),
-                Transition('eof', 'eof', lambda _: print(self.ir_generator.to_ll())),
-            ]),
+        'statement': State(None, [
+            Transition(('identifier', 'LET'), 'let'),
+            Transition(('identifier', 'READ'), 'read'),
+            Transition(('identifier', 'DATA'), 'data'),
+            Transition(('identifier', 'PRINT'), 'print'),
+            Transition(('identifier', 'GO'), 'go'),
+            Transition(('identifier', 'GOTO'), 'goto'),
+            Transition(('identifier', 'IF'), 'if'),
+            Transition(('identifier', 'FOR'), 'for'),
+            Transition(('identifier', 'NEXT'), 'next'),
+            Transition(('identifier', 'DIM'), 'dim'),
+            Transition(('identifier', 'DEF'), 'def'),
+            Transition(('identifier', 'GOSUB'), 'gosub'),
+            Transition(('identifier', 'RETURN'), 'end', 'return_statement'),
+            Transition('remark', 'end', 'remark'),
+            Transition(('identifier', 'END'), 'end', 'end'),
+        ]),
 
-            'statement': State(None, [
-                Transition(('identifier', 'LET'), 'let'),
-                Transition(('identifier', 'READ'), 'read'),
-                Transition(('identifier', 'DATA'), 'data'),
-                Transition(('identifier', 'PRINT'), 'print'),
-                Transition(('identifier', 'GO'), 'go'),
-                Transition(('identifier', 'GOTO'), 'goto'),
-                Transition(('identifier', 'IF'), 'if'),
-                Transition(('identifier', 'FOR'), 'for'),
-                Transition(('identifier', 'NEXT'), 'next'),
-                Transition(('identifier', 'DIM'), 'dim'),
-                Transition(('identifier', 'DEF'), 'def'),
-                Transition(('identifier', 'GOSUB'), 'gosub'),
-                Transition(('identifier', 'RETURN'), 'end', self.ir_generator.return_statement),
-                Transition('remark', 'end', self.ir_generator.remark),
-                Transition(('identifier', 'END'), 'end', self.ir_generator.end),
-            ]),
+        'let': State(None, [
+            Transition('variable', 'let_variable_dimensions', 'lvalue'),
+        ]),
+        'let_variable_dimensions': State(None, [
+            Transition(('special', '('), 'let_variable_dimension'),
+            Transition(None, 'let_assign'),
+        ]),
+        'let_variable_dimension': State(None, [
+            Transition(exp_fsm, 'let_end_of_dimension', 'lvalue_dimension'),
+        ]),
+        'let_end_of_dimension': State(None, [
+            Transition(('special', ','), 'let_variable_dimension'),
+            Transition(('special', ')'), 'let_assign'),
+        ]),
+        'let_assign': State(None, [
+            Transition(('special', '='), 'let_rvalue', 'lvalue_end'),
+        ]),
+        'let_rvalue': State(None, [
+            Transition(exp_fsm, 'end', 'let_rvalue'),
+        ]),
 
-            'let': State(None, [
-                Transition('variable', 'let_variable_dimensions', self.ir_generator.lvalue),
-            ]),
-            'let_variable_dimensions': State(None, [
-                Transition(('special', '('), 'let_variable_dimension'),
-                Transition(None, 'let_assign'),
-            ]),
-            'let_variable_dimension': State(None, [
-                Transition(exp_fsm, 'let_end_of_dimension', self.ir_generator.lvalue_dimension),
-            ]),
-            'let_end_of_dimension': State(None, [
-                Transition(('special', ','), 'let_variable_dimension'),
-                Transition(('special', ')'), 'let_assign'),
-            ]),
-            'let_assign': State(None, [
-                Transition(('special', '='), 'let_rvalue', self.ir_generator.lvalue_end),
-            ]),
-            'let_rvalue': State(None, [
-                Transition(exp_fsm, 'end', self.ir_generator.let_rvalue),
-            ]),
+        'read': State(None, [
+            Transition('variable', 'read_variable_dimensions', 'lvalue'),
+        ]),
+        'read_variable_dimensions': State(None, [
+            Transition(('special', '('), 'read_variable_dimension'),
+            Transition(None, 'end_of_read', 'lvalue_end'),
+        ]),
+        'read_variable_dimension': State(None, [
+            Transition(exp_fsm, 'read_end_of_dimension', 'lvalue_dimension'),
+        ]),
+        'read_end_of_dimension': State(None, [
+            Transition(('special', ','), 'read_variable_dimension'),
+            Transition(('special', ')'), 'end_of_read', 'lvalue_end'),
+        ]),
+        'end_of_read': State(None, [
+            Transition(('special', ','), 'read', 'read_item'),
+            Transition('end_of_line', 'start', 'read_item'),
+        ]),
 
-            'read': State(None, [
-                Transition('variable', 'read_variable_dimensions', self.ir_generator.lvalue),
-            ]),
-            'read_variable_dimensions': State(None, [
-                Transition(('special', '('), 'read_variable_dimension'),
-                Transition(None, 'end_of_read', self.ir_generator.lvalue_end),
-            ]),
-            'read_variable_dimension': State(None, [
-                Transition(exp_fsm, 'read_end_of_dimension', self.ir_generator.lvalue_dimension),
-            ]),
-            'read_end_of_dimension': State(None, [
-                Transition(('special', ','), 'read_variable_dimension'),
-                Transition(('special', ')'), 'end_of_read', self.ir_generator.lvalue_end),
-            ]),
-            'end_of_read': State(None, [
-                Transition(('special', ','), 'read', self.ir_generator.read_item),
-                Transition('end_of_line', 'start', self.ir_generator.read_item),
-            ]),
+        'data': State(None, [
+            Transition(('special', '+'), '+data'),
+            Transition(('special', '-'), '-data'),
+            Transition('number', 'end_of_data', 'data_item'),
+        ]),
+        '+data': State(None, [
+            Transition('number', 'end_of_data', 'data_item'),
+        ]),
+        '-data': State(None, [
+            Transition('number', 'end_of_data', 'negative_data_item'),
+        ]),
+        'end_of_data': State(None, [
+            Transition(('special', ','), 'data'),
+            Transition('end_of_line', 'start'),
+        ]),
 
-            'data': State(None, [
-                Transition(('special', '+'), '+data'),
-                Transition(('special', '-'), '-data'),
-                Transition('number', 'end_of_data', self.ir_generator.data_item),
-            ]),
-            '+data': State(None, [
-                Transition('number', 'end_of_data', self.ir_generator.data_item),
-            ]),
-            '-data': State(None, [
-                Transition('number', 'end_of_data', lambda x: self.ir_generator.data_item('-{}'.format(x))),
-            ]),
-            'end_of_data': State(None, [
-                Transition(('special', ','), 'data'),
-                Transition('end_of_line', 'start'),
-            ]),
+        'print': State(None, [
+            Transition('end_of_line', 'start', 'print.newline'),
+            Transition('string', 'print_after_string', 'print.string'),
+            Transition(exp_fsm, 'print_after_exp', 'print.expression_result'),
+        ]),
+        'print_after_string': State(None, [
+            Transition(('special', ','), 'print_after_comma'),
+            Transition('end_of_line', 'start', 'print.end_with_newline'),
+            Transition(exp_fsm, 'print_after_exp', 'print.expression_result'),
+        ]),
+        'print_after_comma': State(None, [
+            Transition('end_of_line', 'start', 'print.end'),
+            Transition('string', 'print_after_string', 'print.string'),
+            Transition(exp_fsm, 'print_after_exp', 'print.expression_result'),
+        ]),
+        'print_after_exp': State(None, [
+            Transition(('special', ','), 'print_after_comma'),
+            Transition('end_of_line', 'start', 'print.end_with_newline'),
+        ]),
 
-            'print': State(None, [
-                Transition('end_of_line', 'start', self.ir_generator.print.newline),
-                Transition('string', 'print_after_string', self.ir_generator.print.string),
-                Transition(exp_fsm, 'print_after_exp', self.ir_generator.print.expression_result),
-            ]),
-            'print_after_string': State(None, [
-                Transition(('special', ','), 'print_after_comma'),
-                Transition('end_of_line', 'start', self.ir_generator.print.end_with_newline),
-                Transition(exp_fsm, 'print_after_exp', self.ir_generator.print.expression_result),
-            ]),
-            'print_after_comma': State(None, [
-                Transition('end_of_line', 'start', self.ir_generator.print.end),
-                Transition('string', 'print_after_string', self.ir_generator.print.string),
-                Transition(exp_fsm, 'print_after_exp', self.ir_generator.print.expression_result),
-            ]),
-            'print_after_exp': State(None, [
-                Transition(('special', ','), 'print_after_comma'),
-                Transition('end_of_line', 'start', self.ir_generator.print.end_with_newline),
-            ]),
+        'go': State(None, [
+            Transition(('identifier', 'TO'), 'goto'),
+        ]),
+        'goto': State(None, [
+            Transition('number', 'end', 'goto'),
+        ]),
 
-            'go': State(None, [
-                Transition(('identifier', 'TO'), 'goto'),
-            ]),
-            'goto': State(None, [
-                Transition('number', 'end', self.ir_generator.goto),
-            ]),
+        'if': State(None, [
+            Transition(exp_fsm, 'if_operator', 'if_statement.left_exp'),
+        ]),
+        'if_operator': State(None, [
+            Transition('special', 'if_right_exp', 'if_statement.operator'),
+        ]),
+        'if_right_exp': State(None, [
+            Transition(exp_fsm, 'if_then', 'if_statement.right_exp'),
+        ]),
+        'if_then': State(None, [
+            Transition(('identifier', 'THEN'), 'if_target'),
+        ]),
+        'if_target': State(None, [
+            Transition('number', 'end', 'if_statement.target'),
+        ]),
 
-            'if': State(None, [
-                Transition(exp_fsm, 'if_operator', self.ir_generator.if_statement.left_exp),
-            ]),
-            'if_operator': State(None, [
-                Transition('special', 'if_right_exp', self.ir_generator.if_statement.operator),
-            ]),
-            'if_right_exp': State(None, [
-                Transition(exp_fsm, 'if_then', self.ir_generator.if_statement.right_exp),
-            ]),
-            'if_then': State(None, [
-                Transition(('identifier', 'THEN'), 'if_target'),
-            ]),
-            'if_target': State(None, [
-                Transition('number', 'end', self.ir_generator.if_statement.target),
-            ]),
+        'for': State(None, [
+            Transition('variable', 'for_=', 'for_statement.variable'),
+        ]),
+        'for_=': State(None, [
+            Transition(('special', '='), 'for_left_exp'),
+        ]),
+        'for_left_exp': State(None, [
+            Transition(exp_fsm, 'for_to', 'for_statement.left_exp'),
+        ]),
+        'for_to': State(None, [
+            Transition(('identifier', 'TO'), 'for_right_exp'),
+        ]),
+        'for_right_exp': State(None, [
+            Transition(exp_fsm, 'for_step', 'for_statement.right_exp'),
+        ]),
+        'for_step': State(None, [
+            Transition(('identifier', 'STEP'), 'for_step_value'),
+            Transition('end_of_line', 'start', 'for_statement.default_step_value'),
+        ]),
+        'for_step_value': State(None, [
+            Transition(exp_fsm, 'end', 'for_statement.step_value'),
+        ]),
 
-            'for': State(None, [
-                Transition('variable', 'for_=', self.ir_generator.for_statement.variable),
-            ]),
-            'for_=': State(None, [
-                Transition(('special', '='), 'for_left_exp'),
-            ]),
-            'for_left_exp': State(None, [
-                Transition(exp_fsm, 'for_to', self.ir_generator.for_statement.left_exp),
-            ]),
-            'for_to': State(None, [
-                Transition(('identifier', 'TO'), 'for_right_exp'),
-            ]),
-            'for_right_exp': State(None, [
-                Transition(exp_fsm, 'for_step', self.ir_generator.for_statement.right_exp),
-            ]),
-            'for_step': State(None, [
-                Transition(('identifier', 'STEP'), 'for_step_value'),
-                Transition('end_of_line', 'start', lambda _: self.ir_generator.for_statement.step_value(1.)),
-            ]),
-            'for_step_value': State(None, [
-                Transition(exp_fsm, 'end', self.ir_generator.for_statement.step_value),
-            ]),
+        'next': State(None, [
+            Transition('variable', 'end', 'for_statement.next'),
+        ]),
 
-            'next': State(None, [
-                Transition('variable', 'end', self.ir_generator.for_statement.next),
-            ]),
+        'dim': State(None, [
+            Transition('variable', 'dim_(', 'lvalue'),
+        ]),
+        'dim_(': State(None, [
+            Transition(('special', '('), 'dim_dimensions'),
+        ]),
+        'dim_dimensions': State(None, [
+            Transition('number', 'dim_dimension_end', 'dim_dimension'),
+        ]),
+        'dim_dimension_end': State(None, [
+            Transition(('special', ','), 'dim_dimensions'),
+            Transition(('special', ')'), 'dim_end', 'dim_end'),
+        ]),
+        'dim_end': State(None, [
+            Transition(('special', ','), 'dim'),
+            Transition('end_of_line', 'start'),
+        ]),
 
-            'dim': State(None, [
-                Transition('variable', 'dim_(', self.ir_generator.lvalue),
-            ]),
-            'dim_(': State(None, [
-                Transition(('special', '('), 'dim_dimensions'),
-            ]),
-            'dim_dimensions': State(None, [
-                Transition('number', 'dim_dimension_end', self.ir_generator.dim_dimension),
-            ]),
-            'dim_dimension_end': State(None, [
-                Transition(('special', ','), 'dim_dimensions'),
-                Transition(('special', ')'), 'dim_end', self.ir_generator.dim_end),
-            ]),
-            'dim_end': State(None, [
-                Transition(('special', ','), 'dim'),
-                Transition('end_of_line', 'start'),
-            ]),
+        'def': State(None, [
+            Transition('identifier', 'def_(', 'def_identifier'),
+        ]),
+        'def_(': State(None, [
+            Transition(('special', '('), 'def_parameter'),
+        ]),
+        'def_parameter': State(None, [
+            Transition('variable', 'def_)', 'def_parameter'),
+        ]),
+        'def_)': State(None, [
+            Transition(('special', ')'), 'def_='),
+        ]),
+        'def_=': State(None, [
+            Transition(('special', '='), 'def_exp'),
+        ]),
+        'def_exp': State(None, [
+            Transition(exp_fsm, 'end', 'def_exp'),
+        ]),
 
-            'def': State(None, [
-                Transition('identifier', 'def_(', self.ir_generator.def_identifier),
-            ]),
-            'def_(': State(None, [
-                Transition(('special', '('), 'def_parameter'),
-            ]),
-            'def_parameter': State(None, [
-                Transition('variable', 'def_)', self.ir_generator.def_parameter),
-            ]),
-            'def_)': State(None, [
-                Transition(('special', ')'), 'def_='),
-            ]),
-            'def_=': State(None, [
-                Transition(('special', '='), 'def_exp'),
-            ]),
-            'def_exp': State(None, [
-                Transition(exp_fsm, 'end', self.ir_generator.def_exp),
-            ]),
+        'gosub': State(None, [
+            Transition('number', 'end', 'gosub'),
+        ]),
+        'end': State(None, [
+            Transition('end_of_line', 'start'),
+        ]),
+        'eof': State('eof')
+    }
+    return states
 
-            'gosub': State(None, [
-                Transition('number', 'end', self.ir_generator.gosub),
-            ]),
-            'end': State(None, [
-                Transition('end_of_line', 'start'),
-            ]),
-            'eof': State('eof')
-        })
+
+STATES = build_grammar()
+DISPATCH_TABLES = compile_states(STATES)
+IR_GENERATOR_ACTIONS = sorted(
+    {x.semantic_action for x in all_transitions(STATES) if x.semantic_action} - {'write_ir'})
+
+
+class SyntaxRecognizer(EventDrivenModule):
+    def __init__(self, add_external_event=None, output=None, options=CodegenOptions()):
+        # Text stream where the generated IR is written (sys.stdout if None)
+        self.output = output
+        self.options = options
+        super().__init__(add_external_event)
+
+    def write_ir(self):
+        output = self.output or sys.stdout
+        self.ir_generator.to_ll(output)
+        output.write('\n')
+
+    def open_handler(self, event):
+        self.ir_generator = LlvmIrGenerator(event[0], self.options)
+        actions = bind_actions(self.ir_generator, IR_GENERATOR_ACTIONS)
+        actions['write_ir'] = self.write_ir
+        self.fsm = Fsm(STATES, DISPATCH_TABLES, actions)
 
     def transition_on_event(self, event_name):
         return lambda event: self.fsm.transition((event_name, event[0]))
@@ -1,6 +1,18 @@
 from basic_compiler.modules.EventDrivenModule import EventDrivenModule
 
 
+def categorize(c):
+    if c.isalpha():
+        return 'ascii_character'
+    if c.isnumeric():
+        return 'ascii_digit'
+    if c == ' ':
+        return 'ascii_delimiter'
+    if c == '\n':
+        return 'ascii_ctrl'
+    return 'ascii_special'
+
+
 class AsciiCategorizer(EventDrivenModule):
     def get_handlers(self):
         return {
@@ -9,17 +21,28 @@ class AsciiCategorizer(EventDrivenModule):
 
     def ascii_line_handler(self, event):
         self.line = event[0]
+        if self.add_external_events:
+            self.position = None
+            try:
+                self.add_external_events([(categorize(c), c) for c in self.line])
+            except Exception as e:
+                # Batched mode, the module handling the characters knows which one failed
+                self.position = getattr(e, 'event_index', None)
+                raise
+            return
         for self.position, c in enumerate(self.line):
-            if c.isalpha():
-                self.add_external_event(('ascii_character', c))
-            elif c.isnumeric():
-                self.add_external_event(('ascii_digit', c))
-            elif c == ' ':
-                self.add_external_event(('ascii_delimiter', c))
-            elif c == '\n':
-                self.add_external_event(('ascii_ctrl', c))
-            else:
-                self.add_external_event(('ascii_special', c))
+            self.add_external_event((categorize(c), c))
+
+    def stream(self, events):
+        for event in events:
+            if event[0] != 'ascii_line':
+                yield event
+                continue
+            self.line = event[1]
+            for self.position, c in enumerate(self.line):
+                yield (categorize(c), c)
 
     def report(self):
+        if self.position is None:
+            return self.line
         return '{}{}'.format(self.line, '{}^'.format(' ' * (18 + self.position)))
@@ -0,0 +1,124 @@
+from basic_compiler.fsm import compile_states, find_compiled_transition, FsmError
+from basic_compiler.modules.EventDrivenModule import EventDrivenModule
+from basic_compiler.modules.tokenization.AsciiCategorizer import categorize
+from basic_compiler.modules.tokenization.Tokenizer import TRANSITION_TABLE
+
+
+class Dfa:
+    '''Dense state x character class table compiled from a tokenizer transition table.
+
+    Characters are grouped in classes: one class per (category, value) pair mentioned by the transition table, plus one
+    class per category for all other characters. States are numbered and pre-multiplied by the number of classes, so the
+    next state is table[state + character_class], or -1 if there's no transition.'''
+    def __init__(self, transition_table):
+        dispatch_tables = compile_states(transition_table)
+        if any(x.fallback for x in dispatch_tables.values()):
+            raise ValueError('Empty and sub-FSM transitions are not supported by the DFA tokenizer')
+        categories = sorted({x.event if isinstance(x.event, str) else x.event[0]
+                             for state in transition_table.values() for x in state.transitions} | {'eof'})
+        self.classes = [(x, None) for x in categories]
+        self.classes.extend(sorted({x.event for state in transition_table.values() for x in state.transitions
+                                    if not isinstance(x.event, str)}))
+        self.class_index = {x: i for i, x in enumerate(self.classes)}
+
+        state_names = list(transition_table)
+        state_index = {x: i * len(self.classes) for i, x in enumerate(state_names)}
+        self.start = state_index['start']
+        self.accept = {state_index[name]: state.accept for name, state in transition_table.items()}
+        self.state_names = {state_index[x]: x for x in state_names}
+        self.table = []
+        for name in state_names:
+            for event in self.classes:
+                transition = find_compiled_transition(dispatch_tables[name], event)
+                self.table.append(-1 if transition is None else state_index[transition.to])
+        # Cache of character -> class, filled lazily since characters can be any unicode code point
+        self.character_classes = {}
+        self.eof_class = self.class_index[('eof', None)]
+
+    def character_class(self, c):
+        category = categorize(c)
+        character_class = self.class_index.get((category, c.upper()))
+        if character_class is None:
+            character_class = self.class_index[(category, None)]
+        self.character_classes[c] = character_class
+        return character_class
+
+
+DFA = Dfa(TRANSITION_TABLE)
+
+
+class DfaTokenizer(EventDrivenModule):
+    '''Table driven tokenizer, producing the same tokens as AsciiCategorizer and Tokenizer.
+
+    Whole lines are scanned in a single loop and only finished tokens generate events.'''
+    def __init__(self, add_external_event=None, dfa=DFA):
+        self.dfa = dfa
+        self.state = dfa.start
+        self.token_prefix = ''
+        self.line = ''
+        self.position = 0
+        super().__init__(add_external_event)
+
+    def get_handlers(self):
+        return {
+            'ascii_line': self.ascii_line_handler,
+            'eof': self.eof_handler,
+        }
+
+    def error(self, character_class, c):
+        raise FsmError('No valid transition for {}'.format((self.dfa.classes[character_class][0], c)))
+
+    def emit(self, tokens, token):
+        if self.dfa.accept[self.state] != 'delimiter':
+            tokens.append((self.dfa.accept[self.state], token))
+
+    def ascii_line_handler(self, event):
+        self.line = line = event[0]
+        table = self.dfa.table
+        accept = self.dfa.accept
+        start = self.dfa.start
+        character_classes = self.dfa.character_classes
+        state = self.state
+        token_start = 0
+        tokens = []
+        for position, c in enumerate(line):
+            character_class = character_classes.get(c)
+            if character_class is None:
+                character_class = self.dfa.character_class(c)
+            next_state = table[state + character_class]
+            if next_state < 0:
+                # Longest path found
+                self.position = position
+                if not accept[state]:
+                    self.error(character_class, c)
+                self.state = state
+                self.emit(tokens, self.token_prefix + line[token_start:position])
+                self.token_prefix = ''
+                token_start = position
+                next_state = table[start + character_class]
+                if next_state < 0:
+                    self.state = start
+                    self.error(character_class, c)
+            state = next_state
+        self.state = state
+        self.position = len(line)
+        self.token_prefix += line[token_start:]
+        self.emit_events(tokens)
+
+    def eof_handler(self, event):
+        eof_class = self.dfa.eof_class
+        if self.dfa.table[self.state + eof_class] < 0:
+            if not self.dfa.accept[self.state]:
+                self.error(eof_class, None)
+            tokens = []
+            self.emit(tokens, self.token_prefix)
+            self.emit_events(tokens)
+            self.state = self.dfa.start
+        self.token_prefix = ''
+        next_state = self.dfa.table[self.state + eof_class]
+        if next_state < 0:
+            self.error(eof_class, None)
+        self.state = next_state
+
+    def report(self):
+        return '{}{}'.format(self.line, '{}^'.format(' ' * (18 + self.position)))
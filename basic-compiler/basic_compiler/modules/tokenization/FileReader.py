@@ -9,14 +9,17 @@ class FileReader(EventDrivenModule):
             'close': self.close_handler,
         }
 
-    def open_handler(self, event):
+    def open_file(self, filename):
         try:
-            self.file = open(event[0])
+            self.file = open(filename)
         except FileNotFoundError as e:
             import sys
             print(e, file=sys.stderr)
             raise SystemExit(1)
         self.line_count = 0
+
+    def open_handler(self, event):
+        self.open_file(event[0])
         self.add_event(('read',))
 
     def read_handler(self, event):
@@ -33,5 +36,20 @@ class FileReader(EventDrivenModule):
         self.file = None
         self.add_external_event(('eof', None))
 
+    def stream(self, events):
+        for event in events:
+            if event[0] != 'open':
+                yield event
+                continue
+            self.open_file(event[1])
+            # Later stages also handle 'open'
+            yield event
+            with self.file:
+                for self.line in self.file:
+                    self.line_count += 1
+                    yield ('ascii_line', self.line)
+            self.file = None
+            yield ('eof', None)
+
     def report(self):
         return 'Line {}: {}'.format(self.line_count, self.line)
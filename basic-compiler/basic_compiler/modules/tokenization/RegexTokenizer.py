@@ -0,0 +1,168 @@
+import functools
+import re
+
+from basic_compiler.fsm import FsmError
+from basic_compiler.modules.EventDrivenModule import EventDrivenModule
+from basic_compiler.modules.tokenization.AsciiCategorizer import categorize
+from basic_compiler.modules.tokenization.DfaTokenizer import DFA
+
+# Regular expressions matching the same characters as AsciiCategorizer.categorize (exact for ASCII, approximated by
+# unicode character classes otherwise)
+CATEGORY_REGEX = {
+    'ascii_character': r'[^\W\d_]',
+    'ascii_digit': r'\d',
+    'ascii_delimiter': ' ',
+    'ascii_ctrl': r'\n',
+    'ascii_special': r'(?:[^\w \n]|_)',
+}
+
+
+def specific_characters(values):
+    return ''.join(re.escape(x) for value in values for x in sorted({value, value.lower()}))
+
+
+def character_classes_regex(dfa, character_classes):
+    '''Regular expression matching any character in the given DFA character classes.'''
+    regexes = []
+    for category in sorted({x[0] for x in character_classes}):
+        category_regex = CATEGORY_REGEX.get(category)
+        if category_regex is None:
+            continue  # no character belongs to this category
+        values = [x[1] for x in character_classes if x[0] == category and x[1] is not None]
+        if (category, None) not in character_classes:
+            regexes.append('[{}]'.format(specific_characters(values)))
+            continue
+        excluded = [x[1] for x in dfa.classes if x[0] == category and x[1] is not None and x[1] not in values]
+        if excluded:
+            category_regex = '(?![{}]){}'.format(specific_characters(excluded), category_regex)
+        regexes.append(category_regex)
+    return alternation(regexes)
+
+
+def alternation(regexes):
+    regexes = [x for x in regexes if x is not None]
+    if not regexes:
+        return None
+    if len(regexes) == 1:
+        return regexes[0]
+    return '(?:{})'.format('|'.join(regexes))
+
+
+def path_regex(edges, states, start, end):
+    '''Regular expression of all paths from start to end, computed by state elimination.'''
+    edges = {**edges}
+    for eliminated in states:
+        if eliminated in (start, end):
+            continue
+        loop = edges.pop((eliminated, eliminated), None)
+        loop = '(?:{})*'.format(loop) if loop else ''
+        incoming = [(p, r) for (p, q), r in edges.items() if q == eliminated]
+        outgoing = [(q, r) for (p, q), r in edges.items() if p == eliminated]
+        for p, _ in incoming:
+            del edges[(p, eliminated)]
+        for q, _ in outgoing:
+            del edges[(eliminated, q)]
+        for p, r_in in incoming:
+            for q, r_out in outgoing:
+                edges[(p, q)] = alternation([edges.get((p, q)), r_in + loop + r_out])
+    start_loop = edges.get((start, start))
+    if start == end:
+        return '(?:{})*'.format(start_loop) if start_loop else ''
+    to_end = edges.get((start, end))
+    if to_end is None:
+        return None
+    end_loop = edges.get((end, end))
+    to_end += '(?:{})*'.format(end_loop) if end_loop else ''
+    from_end = edges.get((end, start))
+    # Paths may go around start and end before finally stopping at end
+    start_loop = alternation([start_loop, from_end and to_end + from_end])
+    if start_loop:
+        return '(?:{})*{}'.format(start_loop, to_end)
+    return to_end
+
+
+# Deriving the regex takes longer than tokenizing small programs, so it's done once per DFA
+@functools.lru_cache(maxsize=None)
+def dfa_to_regex(dfa):
+    '''Build a master regular expression matching the longest path of the DFA at the current position.
+
+    Each state has an alternative, in a group named s<state index>, matching the inputs leading from the start state to
+    it and not followed by a character with a transition leaving it. The DFA is deterministic, so exactly one group
+    matches: the state where the FSM stops, which can be an accepting state or an error.'''
+    n_classes = len(dfa.classes)
+    states = sorted(dfa.accept)
+    edges = {}
+    for p in states:
+        character_classes = {}
+        for character_class in range(n_classes):
+            q = dfa.table[p + character_class]
+            if q >= 0:
+                character_classes.setdefault(q, []).append(dfa.classes[character_class])
+        for q, x in character_classes.items():
+            regex = character_classes_regex(dfa, x)
+            if regex is not None:
+                edges[(p, q)] = regex
+    alternatives = []
+    for state in states:
+        regex = path_regex(edges, states, dfa.start, state)
+        if regex is None:
+            continue  # unreachable
+        outgoing = alternation([edges[(p, q)] for (p, q) in edges if p == state])
+        if outgoing is not None:
+            regex = '{}(?!{})'.format(regex, outgoing)
+        alternatives.append('(?P<s{}>{})'.format(state, regex))
+    # Alternatives are tried in order, and short ones (such as delimiters and single character specials) match most tokens
+    return re.compile('|'.join(sorted(alternatives, key=len)))
+
+
+class RegexTokenizer(EventDrivenModule):
+    '''Tokenizer producing the same tokens as AsciiCategorizer and Tokenizer, scanning with a regular expression.'''
+    def __init__(self, add_external_event=None, dfa=DFA):
+        self.dfa = dfa
+        self.regex = dfa_to_regex(dfa)
+        self.group_to_state = {'s{}'.format(x): x for x in dfa.accept}
+        self.pending = ''
+        self.line = ''
+        self.position = 0
+        super().__init__(add_external_event)
+
+    def get_handlers(self):
+        return {
+            'ascii_line': self.ascii_line_handler,
+            'eof': self.eof_handler,
+        }
+
+    def error(self, text, position):
+        c = text[position] if position < len(text) else None
+        category = categorize(c) if c is not None else 'eof'
+        raise FsmError('No valid transition for {}'.format((category, c)))
+
+    def scan(self, text, final):
+        accept = self.dfa.accept
+        group_to_state = self.group_to_state
+        tokens = []
+        position = 0
+        for match in self.regex.finditer(text):
+            end = match.end()
+            if match.start() == len(text) or end == len(text) and not final:
+                # The token may continue in the next line
+                break
+            self.position = match.start()
+            token_class = accept[group_to_state[match.lastgroup]]
+            if not token_class or end == match.start():
+                self.error(text, end)
+            if token_class != 'delimiter':
+                tokens.append((token_class, match.group()))
+            position = end
+        self.pending = text[position:]
+        return tokens
+
+    def ascii_line_handler(self, event):
+        self.line = event[0]
+        self.emit_events(self.scan(self.pending + self.line, final=False))
+
+    def eof_handler(self, event):
+        self.emit_events(self.scan(self.pending, final=True))
+
+    def report(self):
+        return '{}{}'.format(self.line, '{}^'.format(' ' * (18 + self.position)))
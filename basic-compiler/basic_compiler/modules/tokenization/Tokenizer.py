@@ -1,4 +1,4 @@
-from basic_compiler.fsm import Fsm, State, Transition
+from basic_compiler.fsm import compile_states, Fsm, State, Transition
 from basic_compiler.modules.EventDrivenModule import EventDrivenModule
 
 TRANSITION_TABLE = {
@@ -91,6 +91,9 @@ TRANSITION_TABLE = {
     'eof': State(None),
 }
 
+# Shared by all tokenizers, which only differ in their current state
+DISPATCH_TABLES = compile_states(TRANSITION_TABLE)
+
 
 class Tokenizer(EventDrivenModule):
     def transition_on_event(self, event_name):
@@ -100,8 +103,36 @@ class Tokenizer(EventDrivenModule):
                 self.add_external_event(next_token)
         return transition
 
+    def handle_events(self, events):
+        # Tokenizer events are already in the format expected by the FSM. Tokens are sent as soon as they're found, so
+        # errors in later modules happen at the same event as without batching
+        transition = self.fsm.transition
+        add_external_event = self.add_external_event
+        i = 0
+        try:
+            for i, event in enumerate(events):
+                next_token = transition(event)
+                if next_token and next_token[0] != 'delimiter':
+                    add_external_event(next_token)
+        except Exception as e:
+            # Position of the error, reported by the module sending the events
+            e.event_index = i
+            raise
+
+    def stream(self, events):
+        transition = self.fsm.transition
+        for event in events:
+            if event[0] not in self.handlers:
+                yield event
+                continue
+            next_token = transition(event)
+            if next_token and next_token[0] != 'delimiter':
+                yield next_token
+            if event[0] == 'eof':
+                yield event
+
     def get_handlers(self):
-        self.fsm = Fsm(TRANSITION_TABLE)
+        self.fsm = Fsm(TRANSITION_TABLE, DISPATCH_TABLES)
         return {
             x: self.transition_on_event(x)
             for x in ('ascii_character', 'ascii_digit', 'ascii_delimiter', 'ascii_ctrl', 'ascii_special', 'eof')
@@ -0,0 +1,54 @@
+'''Compare compilation time of the expression engines on generated programs with deeply nested arithmetic.'''
+import argparse
+import random
+from pathlib import Path
+import tempfile
+import timeit
+
+from basic_compiler.main import compile_to_ir
+from basic_compiler.modules.semantic.options import CodegenOptions, EXPRESSION_ENGINES
+
+OPERATORS = ('+', '-', '*', '/', '↑')
+OPERANDS = ('A', 'B', 'C', 'X', 'Y', '2', '3.5', 'M(I, J)', 'SIN(X)', 'SQR(Y)')
+
+
+def random_expression(rng, depth):
+    if depth == 0:
+        return rng.choice(OPERANDS)
+    left = random_expression(rng, depth - 1)
+    right = random_expression(rng, rng.randrange(depth))
+    expression = '{} {} {}'.format(left, rng.choice(OPERATORS), right)
+    return '({})'.format(expression) if rng.random() < 0.5 else expression
+
+
+def write_program(path, lines, depth, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write('1 DIM M(10, 10)\n')
+        for i in range(lines):
+            f.write('{} LET {} = {}\n'.format(i + 2, rng.choice('ABCXY'), random_expression(rng, depth)))
+        f.write('{} END\n'.format(lines + 2))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark expression engines.')
+    parser.add_argument('--lines', type=int, default=2000, help='number of generated LET statements')
+    parser.add_argument('--depth', type=int, nargs='+', default=[2, 4, 8], help='nesting depths of the expressions')
+    return parser.parse_args()
+
+
+def main(args):
+    print('{: <24}{}'.format('depth', ''.join('{: >10}'.format(x) for x in EXPRESSION_ENGINES)))
+    with tempfile.TemporaryDirectory() as directory:
+        for depth in args.depth:
+            source = Path(directory) / 'depth_{}.bas'.format(depth)
+            write_program(source, args.lines, depth)
+            results = []
+            for engine in EXPRESSION_ENGINES:
+                options = CodegenOptions(expression_engine=engine)
+                results.append(min(timeit.repeat(lambda: compile_to_ir(source, options=options), number=1, repeat=3)))
+            print('{: <24}{}'.format(depth, ''.join('{: >9.3f}s'.format(x) for x in results)))
+
+
+if __name__ == '__main__':
+    main(parse_args())
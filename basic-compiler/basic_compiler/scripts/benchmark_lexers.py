@@ -0,0 +1,45 @@
+'''Compare tokenization time of the lexer implementations on the sample programs.'''
+import argparse
+from pathlib import Path
+import timeit
+
+from basic_compiler.main import LEXERS
+
+SAMPLE_PROGRAMS = Path(__file__).resolve().parents[3] / 'sample-programs'
+
+
+def tokenize(lexer, lines):
+    modules = LEXERS[lexer]()
+    tokens = []
+    for source, sink in zip(modules, modules[1:]):
+        source.set_external_event_handler(sink.handle_event)
+    modules[-1].set_external_event_handler(tokens.append)
+    for line in lines:
+        modules[0].handle_event(('ascii_line', line))
+    modules[-1].handle_event(('eof', None))
+    return tokens
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark lexers.')
+    parser.add_argument('--repeat', type=int, default=1000, help='times each program is concatenated to itself')
+    parser.add_argument('sources', type=Path, nargs='*', help='source files (defaults to the sample programs)')
+    return parser.parse_args()
+
+
+def main(args):
+    sources = args.sources or sorted(SAMPLE_PROGRAMS.glob('*.bas'))
+    print('{: <24}{}'.format('program', ''.join('{: >10}'.format(x) for x in LEXERS)))
+    for source in sources:
+        with open(source) as f:
+            lines = f.readlines() * args.repeat
+        results = []
+        expected_tokens = tokenize('fsm', lines)
+        for lexer in LEXERS:
+            assert tokenize(lexer, lines) == expected_tokens, '{} output differs from fsm'.format(lexer)
+            results.append(min(timeit.repeat(lambda: tokenize(lexer, lines), number=1, repeat=3)))
+        print('{: <24}{}'.format(source.name, ''.join('{: >9.3f}s'.format(x) for x in results)))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,59 @@
+'''Compare compilation time of the event engine and generator pipelines on the sample programs.'''
+import argparse
+from contextlib import redirect_stderr
+import io
+from pathlib import Path
+import tempfile
+import timeit
+
+from basic_compiler.main import compile_to_ir, LEXERS, PIPELINES
+from basic_compiler.scripts.benchmark_lexers import SAMPLE_PROGRAMS
+
+
+def repeat_program(source, repeat, directory):
+    '''Write a copy of source with its lines repeated, renumbering labels so they stay unique.'''
+    with open(source) as f:
+        lines = [x for x in f.readlines() if x.split()[1:2] != ['END']]
+    output = Path(directory) / source.name
+    with open(output, 'w') as f:
+        for i in range(repeat):
+            for line in lines:
+                number, statement = line.split(' ', 1)
+                for target in ('GOTO ', 'THEN ', 'GOSUB '):
+                    # Jump targets are in the same copy of the program
+                    if target in statement:
+                        prefix, label = statement.rsplit(target, 1)
+                        statement = '{}{}{}{:06}\n'.format(prefix, target, label.strip(), i)
+                f.write('{}{:06} {}'.format(number, i, statement))
+    return output
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark compiler pipelines.')
+    parser.add_argument('--repeat', type=int, default=200, help='times each program is concatenated to itself')
+    parser.add_argument('--lexer', choices=LEXERS, default='fsm', help='lexical analyzer implementation')
+    parser.add_argument('sources', type=Path, nargs='*', help='source files (defaults to the sample programs)')
+    return parser.parse_args()
+
+
+def main(args):
+    sources = args.sources or sorted(SAMPLE_PROGRAMS.glob('*.bas'))
+    print('{: <24}{}'.format('program', ''.join('{: >10}'.format(x) for x in PIPELINES)))
+    with tempfile.TemporaryDirectory() as directory:
+        for source in sources:
+            source = repeat_program(source, args.repeat, directory)
+            results = []
+            try:
+                with redirect_stderr(io.StringIO()):
+                    expected_ir = compile_to_ir(source, args.lexer, 'events')
+            except Exception as e:
+                print('{: <24}compilation failed ({}: {})'.format(source.name, type(e).__name__, e))
+                continue
+            for pipeline in PIPELINES:
+                assert compile_to_ir(source, args.lexer, pipeline) == expected_ir, '{} output differs'.format(pipeline)
+                results.append(min(timeit.repeat(lambda: compile_to_ir(source, args.lexer, pipeline), number=1, repeat=3)))
+            print('{: <24}{}'.format(source.name, ''.join('{: >9.3f}s'.format(x) for x in results)))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,123 @@
+'''Compile server, keeping a warm compiler process that listens on a Unix socket.
+
+Clients send one JSON request per connection, on a single line, and receive a JSON response line:
+
+* {"source": "a.bas", "lexer": "fsm", "pipeline": "events", "options": {"promote_variables": true}} compiles a source to
+  IR, returned in "ir". Only "source" is required, and options are CodegenOptions fields.
+* {"argv": ["--bin", "a", "a.bas"]} runs the command line compiler. Outputs are written to the paths given in argv.
+
+Relative paths are resolved from "cwd", if given. Responses have the exit "status" (0 on success) and the messages
+printed by the compiler in "output". Requests are handled one at a time.'''
+import argparse
+import contextlib
+import io
+import json
+import os
+from pathlib import Path
+import socket
+import socketserver
+import tempfile
+import traceback
+
+from basic_compiler import main
+from basic_compiler.modules.semantic.options import CodegenOptions
+
+DEFAULT_SOCKET = Path(os.environ.get('XDG_RUNTIME_DIR', tempfile.gettempdir())) / 'basic_compiler.sock'
+
+
+class RequestError(RuntimeError):
+    pass
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def compile_request(request):
+    '''Handle a request, returning the response fields other than status and output.'''
+    if 'argv' in request:
+        args = main.parse_args(request['argv'])
+        # lli would write the program output to the server's standard output
+        if args.lli:
+            raise RequestError('--lli is not supported by the compile server')
+        main.main(args)
+        return {}
+    if 'source' in request:
+        options = CodegenOptions(**request.get('options', {}))
+        return {'ir': main.compile_to_ir(request['source'], request.get('lexer', 'fsm'),
+                                         request.get('pipeline', 'events'), options)}
+    raise RequestError('Requests need a source or argv')
+
+
+def handle_request(request):
+    output = io.StringIO()
+    response = {'status': 0}
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            with working_directory(request.get('cwd', '.')):
+                response.update(compile_request(request))
+        except SystemExit as e:
+            # argparse and the compiler exit with a status (or an error message) on invalid input
+            if isinstance(e.code, str):
+                print(e.code)
+            response['status'] = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            response['status'] = 1
+    response['output'] = output.getvalue()
+    return response
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError as e:
+            response = {'status': 1, 'output': 'Invalid request: {}\n'.format(e)}
+        else:
+            response = handle_request(request)
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+def make_server(path=DEFAULT_SOCKET):
+    path = Path(path)
+    # Remove the socket left by a previous server
+    if path.is_socket():
+        path.unlink()
+    return socketserver.UnixStreamServer(str(path), RequestHandler)
+
+
+def send_request(request, path=DEFAULT_SOCKET):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(str(path))
+        with s.makefile('rwb') as f:
+            f.write(json.dumps(request).encode() + b'\n')
+            f.flush()
+            return json.loads(f.readline())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='BASIC compile server.')
+    parser.add_argument('--socket', type=Path, default=DEFAULT_SOCKET, help='path of the Unix socket to listen on')
+    return parser.parse_args()
+
+
+def serve(path=DEFAULT_SOCKET):
+    path = Path(path)
+    with make_server(path) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            path.unlink()
+
+
+if __name__ == '__main__':
+    serve(parse_args().socket)
@@ -0,0 +1,55 @@
+'''LLVM toolchain driver. IR is fed to clang and lli through pipes, so no intermediate files are needed.'''
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+def text_writer(text):
+    return lambda output: output.write(text)
+
+
+def file_writer(path):
+    def write(output):
+        with open(path) as f:
+            shutil.copyfileobj(f, output)
+    return write
+
+
+def run(command, write_input, capture_output=False):
+    '''Run command, with write_input(stream) writing its standard input.
+
+    The standard error of command is written to sys.stderr when it exits, so that it's captured with the rest of the
+    compiler's output when sys.stderr is redirected. Returns the standard output of command if capture_output is set.'''
+    # stderr goes to a file instead of a pipe, so that the process can't block on it while its input is written
+    with tempfile.TemporaryFile('w+') as errors:
+        with subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE if capture_output else None,
+                              stderr=errors, text=True) as process:
+            try:
+                write_input(process.stdin)
+                process.stdin.close()
+                output = process.stdout.read() if capture_output else None
+            except BaseException:
+                process.kill()
+                raise
+        errors.seek(0)
+        error_output = errors.read()
+    sys.stderr.write(error_output)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=error_output)
+    return output
+
+
+def optimize(write_ir, output=None):
+    '''Optimize IR with clang, writing it to the output path. If output is None, return the optimized IR.'''
+    return run(['clang', '-Ofast', '-S', '-emit-llvm', '-x', 'ir', '-', '-o', str(output or '-')], write_ir,
+               capture_output=output is None)
+
+
+def link(write_ir, binary):
+    # Linking also optimizes with -Ofast, so optimizing and linking are done by a single clang invocation
+    run(['clang', '-Ofast', '-x', 'ir', '-', '-o', str(binary), '-lm'], write_ir)
+
+
+def lli(write_ir):
+    run(['lli', '-'], write_ir)
@@ -0,0 +1,4 @@
+10 DIM A(10)
+20 LET K = 1
+30 LET A(1) = 5
+40 PRINT K * 2 + A(K)
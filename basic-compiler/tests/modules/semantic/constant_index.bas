@@ -0,0 +1,3 @@
+10 DIM A(10)
+20 LET A(2) = 3
+30 PRINT A(2) + 1
@@ -0,0 +1,7 @@
+10 DEF FNA(X) = X * X + 1
+20 DEF FNB(Y) = FNA(Y) - FNA(2) + Y
+30 DEF FNI(Z) = Z
+40 LET Q = 3
+50 PRINT FNB(Q), FNA(FNA(Q)), FNI(Q + 1), FNI(5)
+60 PRINT FNC(2)
+70 DEF FNC(X) = X + Q
@@ -0,0 +1,7 @@
+10 DIM A(3), B(2, 2)
+20 FOR I = 0 TO 3
+30 LET A(I) = I
+40 NEXT I
+50 LET B(2, 2) = 5
+60 LET B(2, 1) = 4
+70 PRINT A(3), B(2, 2), B(2, 1), A(0)
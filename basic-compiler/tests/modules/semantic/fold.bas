@@ -0,0 +1,9 @@
+10 LET X = 3
+20 PRINT 2 ↑ 3 - 1
+30 PRINT X ↑ 2
+40 PRINT X + 0
+50 PRINT 1 * X / 1
+60 PRINT 0 - X
+70 FOR I = 1 TO 2 * 2 STEP 4 / 2
+80 PRINT I
+90 NEXT I
@@ -0,0 +1,13 @@
+10 FOR I = 1 TO 10
+20 PRINT I
+30 LET I = I + 2
+40 NEXT I
+50 FOR J = 3 TO 1 STEP -1
+60 PRINT J
+70 NEXT J
+80 PRINT J
+90 DIM A(10)
+100 FOR K = 0 TO 9
+110 LET A(K) = A(K) + K * 2
+120 NEXT K
+130 PRINT A(9)
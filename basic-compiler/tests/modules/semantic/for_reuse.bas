@@ -0,0 +1,10 @@
+10 FOR I = 1 TO 5
+20 FOR I = 1 TO 6
+30 NEXT I
+40 PRINT I
+50 NEXT I
+60 FOR J = 1 TO 3
+70 NEXT J
+80 FOR J = 5 TO 6
+90 NEXT J
+100 PRINT J
@@ -0,0 +1,9 @@
+10 DIM M(3, 4)
+20 FOR I = 0 TO 2
+30 FOR J = 0 TO 3
+40 LET M(I, J) = I * 10 + J
+50 NEXT J
+60 NEXT I
+70 PRINT M(2, 3)
+80 LET K = 1
+90 PRINT M(K, K + 1) + M(1, 2)
@@ -0,0 +1,2 @@
+10 LET X = 3
+20 PRINT -X, -X
@@ -0,0 +1,15 @@
+10 LET N = 0
+20 FOR I = 1 TO 5
+30 GOSUB 100
+40 NEXT I
+50 PRINT N
+60 GOSUB 200
+70 PRINT "End"
+80 RETURN
+100 LET N = N + I
+110 GOSUB 300
+120 RETURN
+200 PRINT "Subroutine"
+210 RETURN
+300 LET N = N * 2
+310 RETURN
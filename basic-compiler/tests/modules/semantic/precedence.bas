@@ -0,0 +1,2 @@
+10 LET A = 1
+20 PRINT A + 2 * 3 ↑ 2 * 2, A + 2 * 3 - 1
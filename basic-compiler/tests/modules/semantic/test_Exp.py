@@ -0,0 +1,63 @@
+import pytest
+
+# Imported first to resolve the circular import between the syntax recognizer and semantic modules
+from basic_compiler.modules.syntax_recognizer.SyntaxRecognizer import CompilerSyntaxError
+from basic_compiler.modules.semantic import llvm
+from basic_compiler.modules.semantic.Exp import Exp, fold, to_double
+from basic_compiler.modules.semantic.functions import Program
+
+
+def create_exp():
+    state = llvm.SemanticState('test.bas')
+    state.current_function = Program()
+    return Exp(state), state
+
+
+def binary_expression(exp, operand, operator, operand_2):
+    for x, handler in ((operand, exp.number), (operator, exp.operator), (operand_2, exp.number)):
+        if handler == exp.number and not x[0].isdigit():
+            exp.variable(x)
+            exp.end_of_variable()
+        else:
+            handler(x)
+    exp.end_expression()
+    return exp.state.exp_result
+
+
+def generated_instructions(state):
+    return [x.to_ll() for x in state.current_function.instructions[1:]]
+
+
+def test_to_double():
+    assert to_double('2.5') == 2.5
+    with pytest.raises(CompilerSyntaxError):
+        to_double('x')
+
+
+def test_fold():
+    assert fold(lambda x, y: x * y, 2., 3.) == 6.
+    assert fold(lambda x, y: x / y, 1., 0.) is None
+    assert fold(lambda x, y: x * y, 1e200, 1e200) is None
+    assert fold(lambda x, y: x * y, 1e10, 1e10) is None  # would need exponent notation
+
+
+def test_literals_are_folded():
+    exp, state = create_exp()
+    assert binary_expression(exp, '2', '*', '3.5') == 7.
+    assert binary_expression(exp, '2', '↑', '10') == 1024.
+    assert not generated_instructions(state)
+
+
+def test_identity_operands_are_removed():
+    for operand, operator, operand_2 in (('X', '+', '0'), ('0', '+', 'X'), ('X', '-', '0'), ('1', '*', 'X'),
+                                         ('X', '*', '1'), ('X', '/', '1'), ('X', '↑', '1')):
+        exp, state = create_exp()
+        assert binary_expression(exp, operand, operator, operand_2) == '%X_0'
+        assert generated_instructions(state) == ['%X_0 = load double, double* @X, align 8']
+
+
+def test_square_is_multiplication():
+    exp, state = create_exp()
+    assert binary_expression(exp, 'X', '↑', '2') == '%fmul_1'
+    assert generated_instructions(state)[1] == '%fmul_1 = fmul fast double %X_0, %X_0'
+    assert 'llvm.pow.f64' not in state.external_symbols
@@ -0,0 +1,94 @@
+import pytest
+
+# Imported first to resolve the circular import between the syntax recognizer and semantic modules
+from basic_compiler.modules.syntax_recognizer.SyntaxRecognizer import CompilerSyntaxError
+from basic_compiler.modules.semantic import llvm
+from basic_compiler.modules.semantic.ExpTree import (
+    BinaryOperation, ExpressionParser, ExpTree, FunctionCall, Negative, Number, Variable)
+from basic_compiler.modules.semantic.functions import Program
+
+
+def create_exp_tree():
+    state = llvm.SemanticState('test.bas')
+    state.current_function = Program()
+    return ExpTree(state), state
+
+
+def generated_instructions(state):
+    return [x.to_ll() for x in state.current_function.instructions[1:]]
+
+
+def test_precedence_and_associativity():
+    # A + B * C ↑ 2 * D - E
+    tokens = [('variable', 'A'), ('operator', '+'), ('variable', 'B'), ('operator', '*'), ('variable', 'C'),
+              ('operator', '↑'), ('number', 2.), ('operator', '*'), ('variable', 'D'), ('operator', '-'),
+              ('variable', 'E')]
+    a, b, c, d, e = (Variable(x, ()) for x in 'ABCDE')
+    assert ExpressionParser(tokens).parse() == BinaryOperation(
+        '-', BinaryOperation('+', a, BinaryOperation('*', BinaryOperation('*', b, BinaryOperation('↑', c, Number(2.))), d)),
+        e)
+
+
+def test_negative_sign():
+    assert ExpressionParser([('negative', None), ('negative', None), ('negative', None), ('number', 2.)]).parse() == \
+        Number(-2.)
+    # The negative sign binds tighter than ↑
+    tokens = [('negative', None), ('variable', 'X'), ('operator', '↑'), ('number', 2.)]
+    assert ExpressionParser(tokens).parse() == BinaryOperation('↑', Negative(Variable('X', ())), Number(2.))
+
+
+def test_functions_and_arrays():
+    tokens = [('function', 'SIN'), ('(', None), ('variable', 'M'), ('[', None), ('number', 1.), (',', None),
+              ('variable', 'I'), (',', None), (']', None), (')', None)]
+    assert ExpressionParser(tokens).parse() == \
+        FunctionCall('SIN', Variable('M', (Number(1.), Variable('I', ()))), 0)
+    rnd = [('function', 'RND'), ('(', None), ('number', 1.), (')', None)]
+    # Calls to RND return different values, so they're different nodes
+    tree = ExpressionParser(rnd + [('operator', '+')] + rnd).parse()
+    assert tree.left != tree.right
+
+
+def test_syntax_errors():
+    with pytest.raises(CompilerSyntaxError):
+        ExpressionParser([('(', None), ('number', 1.)]).parse()
+    with pytest.raises(CompilerSyntaxError):
+        ExpressionParser([('number', 1.), ('number', 2.)]).parse()
+
+
+def nested_sum(exp, variable, number):
+    # (variable + number)
+    exp.operator('(')
+    exp.variable(variable)
+    exp.end_of_variable()
+    exp.operator('+')
+    exp.number(number)
+    exp.end_expression()
+    exp.end_nested_expression()
+
+
+def test_repeated_subexpressions_are_compiled_once():
+    exp, state = create_exp_tree()
+    nested_sum(exp, 'X', '1')
+    exp.operator('*')
+    nested_sum(exp, 'X', '1')
+    exp.end_expression()
+    assert generated_instructions(state) == [
+        '%X_0 = load double, double* @X, align 8',
+        '%fadd_1 = fadd fast double %X_0, 1.0',
+        '%fmul_2 = fmul fast double %fadd_1, %fadd_1',
+    ]
+    assert state.exp_result == '%fmul_2'
+
+
+def test_calls_with_side_effects_are_not_reused():
+    exp, state = create_exp_tree()
+    for _ in range(2):
+        if exp.tokens:
+            exp.operator('+')
+        exp.operator('RND')
+        exp.operator('(')
+        exp.number('1')
+        exp.end_expression()
+        exp.end_nested_expression()
+    exp.end_expression()
+    assert sum(1 for x in generated_instructions(state) if '@rand' in x) == 2
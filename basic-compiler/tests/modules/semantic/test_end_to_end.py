@@ -8,6 +8,7 @@ from unittest.mock import call, MagicMock
 import pytest
 
 from basic_compiler.modules.EventEngine import EventEngine
+from basic_compiler.modules.semantic.options import CodegenOptions
 from basic_compiler.modules.syntax_recognizer.SyntaxRecognizer import SyntaxRecognizer
 from basic_compiler.modules.tokenization.AsciiCategorizer import AsciiCategorizer
 from basic_compiler.modules.tokenization.FileReader import FileReader
@@ -34,15 +35,33 @@ def lli_run(source):
     return completed_process.stdout
 
 
-def create_event_engine():
+def create_event_engine(options=CodegenOptions()):
     return EventEngine([
         FileReader(),
         AsciiCategorizer(),
         Tokenizer(),
-        SyntaxRecognizer(),
+        SyntaxRecognizer(options=options),
     ])
 
 
+CODEGEN_OPTIONS = [
+    CodegenOptions(),
+    CodegenOptions(promote_variables=True),
+    CodegenOptions(integer_indices=True),
+    CodegenOptions(promote_variables=True, integer_indices=True),
+    CodegenOptions(heap_array_threshold=0),
+    CodegenOptions(promote_variables=True, integer_indices=True, heap_array_threshold=0),
+    CodegenOptions(buffered_print=True),
+    CodegenOptions(gosub_return_stack=True),
+    CodegenOptions(promote_variables=True, integer_indices=True, gosub_return_stack=True),
+    CodegenOptions(inline_functions=True),
+    CodegenOptions(promote_variables=True, integer_indices=True, inline_functions=True),
+    CodegenOptions(expression_engine='tree'),
+    CodegenOptions(promote_variables=True, integer_indices=True, heap_array_threshold=0, inline_functions=True,
+                   expression_engine='tree'),
+]
+
+
 def format_float(n):
     return '{0:.6f}\n'.format(n)
 
@@ -61,10 +80,22 @@ def format_float(n):
     ('bubblesort.bas', ''.join(format_float(x) for x in range(20))),
     ('eratosthenes_sieve.bas', ''.join(format_float(x) for x in [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37])),
     ('def.bas', ''.join(format_float(x) for x in (math.cos(y / 10) * math.exp(-y / 10) for y in range(0, 101, 1)))),
+    ('def_nested.bas', '8.000000 101.000000 4.000000 5.000000\n5.000000\n'),
     ('gosub.bas', 'Start\nSubroutine\nMiddle\nSubroutine\nEnd\n'),
+    ('nested_gosub.bas', '{}Subroutine\nEnd\n'.format(format_float(114))),
+    ('for_integer.bas', ''.join(format_float(x) for x in [1, 4, 7, 10, 3, 2, 1, 0, 18])),
+    ('for_reuse.bas', format_float(7) * 2),
+    ('constant_index.bas', format_float(4)),
+    ('matrix.bas', ''.join(format_float(x) for x in [23, 24])),
+    ('dim_bounds.bas', '3.000000 5.000000 4.000000 0.000000\n'),
+    ('array_expression.bas', format_float(7)),
+    ('precedence.bas', '37.000000 6.000000\n'),
+    ('negate.bas', '-3.000000 -3.000000\n'),
+    ('fold.bas', ''.join(format_float(x) for x in [7, 9, 3, 3, -3, 1, 3])),
 ])
-def test_compiler_end_to_end(source_filename, expected_output):
-    event_engine = create_event_engine()
+@pytest.mark.parametrize('options', CODEGEN_OPTIONS)
+def test_compiler_end_to_end(source_filename, expected_output, options):
+    event_engine = create_event_engine(options)
 
     with io.StringIO() as f:
         with redirect_stdout(f):
@@ -86,3 +117,41 @@ def test_rand_end_to_end():
     for l in output.splitlines():
         value = float(l.rstrip())
         assert 0 <= value <= 1
+
+
+@lli
+def test_heap_allocation_failure_end_to_end(tmp_path):
+    source = tmp_path / 'huge_array.bas'
+    # 800 TB, more than the address space of a process
+    source.write_text('10 DIM A(100000000000000)\n20 PRINT 1\n')
+    event_engine = create_event_engine(CodegenOptions(heap_array_threshold=0))
+
+    with io.StringIO() as f:
+        with redirect_stdout(f):
+            event_engine.start(('open', source))
+        s = f.getvalue()
+    completed_process = subprocess.run(['lli'], input=s, capture_output=True, text=True)
+    assert completed_process.returncode == 1
+    assert completed_process.stdout == ''
+    assert completed_process.stderr == 'Not enough memory for DIM arrays\n'
+
+
+@lli
+@pytest.mark.parametrize('options', [
+    CodegenOptions(gosub_return_stack=True),
+    CodegenOptions(gosub_return_stack=True, buffered_print=True),
+])
+def test_return_stack_overflow_end_to_end(tmp_path, options):
+    source = tmp_path / 'recursion.bas'
+    source.write_text('10 PRINT "A"\n20 GOSUB 10\n')
+    event_engine = create_event_engine(options)
+
+    with io.StringIO() as f:
+        with redirect_stdout(f):
+            event_engine.start(('open', source))
+        s = f.getvalue()
+    completed_process = subprocess.run(['lli'], input=s, capture_output=True, text=True)
+    assert completed_process.returncode == 1
+    # Output printed before the overflow is flushed. Line 10 runs once, then in each of the 4095 nested GOSUBs
+    assert completed_process.stdout == 'A\n' * 4096
+    assert completed_process.stderr == 'GOSUB nested too deep\n'
@@ -0,0 +1,102 @@
+# Imported first to resolve the circular import between the syntax recognizer and semantic modules
+from basic_compiler.modules.syntax_recognizer import SyntaxRecognizer  # noqa: F401
+from basic_compiler.modules.semantic import ir, llvm, placeholders
+from basic_compiler.modules.semantic.functions import Program
+from basic_compiler.modules.semantic.Print import Print
+
+
+def test_instruction_to_ll():
+    ptr = ir.Pointer('double', '@X', 8)
+    assert ir.Load('%X_0', 'double', ptr).to_ll() == '%X_0 = load double, double* @X, align 8'
+    assert ir.Store('double', 1.0, ptr).to_ll() == 'store double 1.0, double* @X, align 8'
+    assert ir.BinaryOperator('%fadd_1', 'fadd', '%X_0', 2.0).to_ll() == '%fadd_1 = fadd fast double %X_0, 2.0'
+    assert ir.BinaryOperator('%i', 'add', '%j', 1, type='i32', flags=None).to_ll() == '%i = add i32 %j, 1'
+    assert ir.Call(None, 'void', 'exit', ['i32 0'], attributes='noreturn #0').to_ll() == \
+        'tail call void @exit(i32 0) noreturn #0'
+    assert ir.Call('%r', 'double', 'f', ['double 1.0'], fast=True).to_ll() == '%r = tail call fast double @f(double 1.0) #0'
+    assert ir.GetElementPtr('%p', '[2 x double]', '@A', ['%i']).to_ll() == \
+        '%p = getelementptr inbounds [2 x double], [2 x double]* @A, i32 0, i32 %i'
+    assert ir.IndirectBr('%t', ['a', 'b']).to_ll() == 'indirectbr i8* %t, [ label %a, label %b ]'
+    assert ir.Switch('i32', '%r', 'd', [(1, 'a'), (2, 'b')]).to_ll() == \
+        'switch i32 %r, label %d [ i32 1, label %a i32 2, label %b ]'
+    assert ir.Ret().to_ll() == 'ret void'
+    assert ir.Label('a').to_ll() == 'a:'
+
+
+def test_is_block_terminator():
+    for instruction in (ir.Br('a'), ir.CondBr('%c', 'a', 'b'), ir.Ret(), ir.Unreachable(), ir.IndirectBr('%t', []),
+                        ir.Switch('i32', '%r', 'd', [])):
+        assert llvm.is_block_terminator(instruction)
+    for instruction in (ir.Label('a'), ir.Comment(' text'), ir.Call(None, 'void', 'f', []), lambda state: None):
+        assert not llvm.is_block_terminator(instruction)
+
+
+def test_resolve_placeholders():
+    state = llvm.SemanticState('test.bas')
+    state.entry_point = 10
+    state.goto_targets = {20}
+    state.gosub_targets = {30}
+    state.const_data = [1., 2.]
+    resolution = placeholders.Resolution(state)
+    assert placeholders.LabelBranch(10).resolve(resolution) is None
+    assert placeholders.LabelBranch(20).resolve(resolution).to_ll() == 'br label %label_20'
+    assert placeholders.LabelDefinition(10).resolve(resolution).to_ll() == 'label_10:'
+    assert placeholders.LabelDefinition(40).resolve(resolution) is None
+    assert placeholders.DataElementPtr('%p', '%i').resolve(resolution).to_ll() == \
+        '%p = getelementptr [2 x double], [2 x double]* @DATA, i32 0, i32 %i'
+    assert placeholders.CallTargetBranch().resolve(resolution).labels == ['label_10', 'label_30']
+
+
+def test_forwarded_load():
+    state = llvm.SemanticState('test.bas')
+    state.entry_point = 10
+    state.goto_targets = {30}
+    resolution = placeholders.Resolution(state)
+    pointer = ir.Pointer('double', '@X', 8)
+    assert placeholders.ForwardedLoad('%X_1', pointer, '%X_0', [20]).resolve(resolution).to_ll() == \
+        '%X_1 = bitcast double %X_0 to double'
+    assert placeholders.ForwardedLoad('%X_1', pointer, '%X_0', [20, 30]).resolve(resolution).to_ll() == \
+        '%X_1 = load double, double* @X, align 8'
+
+
+def test_array_index_reuse():
+    state = llvm.SemanticState('test.bas')
+    state.current_function = Program()
+    state.variable_dimensions['A'] = [10]
+    pointer = llvm.get_variable_ptr(state, 'A', ['%X_0'])
+    assert llvm.get_variable_ptr(state, 'A', ['%X_0']) == pointer
+    assert [x.to_ll() for x in state.current_function.instructions[1:]] == [
+        '%fptoui_0 = fptoui double %X_0 to i32',
+        '%ptr_1 = getelementptr inbounds [10 x double], [10 x double]* @A, i32 0, i32 %fptoui_0',
+    ]
+
+
+def test_constant_element_ptr():
+    state = llvm.SemanticState('test.bas')
+    state.variable_dimensions['A'] = ['10']
+    assert str(llvm.get_variable_ptr(state, 'A', [2.])) == \
+        'double* getelementptr inbounds ([10 x double], [10 x double]* @A, i32 0, i32 2), align 16'
+
+
+def test_string_interning():
+    state = llvm.SemanticState('test.bas')
+    state.current_function = Program()
+    print_statement = Print(state)
+    state.exp_result = '%X_0'
+    for _ in range(2):
+        print_statement.string('"X ="')
+        print_statement.expression_result()
+        print_statement.end_with_newline()
+    assert state.intern_string('%f') == ('@.str2', 3)
+    assert state.string_constants == {'X =': ('@.str0', 4), '%s %f\\0A': ('@.str1', 7), '%f': ('@.str2', 3)}
+    assert state.current_function.instructions[1].to_ll() == state.current_function.instructions[2].to_ll()
+
+
+def test_substitute():
+    values = {'%arg': '%X_0', '%fmul_1': '%fmul_1.FNA2'}
+    instruction = ir.substitute(ir.BinaryOperator('%fmul_1', 'fmul', '%arg', '%arg'), values)
+    assert instruction.to_ll() == '%fmul_1.FNA2 = fmul fast double %X_0, %X_0'
+    instruction = ir.substitute(ir.Call('%COS_3', 'double', 'llvm.cos.f64', ['double %fmul_1'], fast=True), values)
+    assert instruction.to_ll() == '%COS_3 = tail call fast double @llvm.cos.f64(double %fmul_1.FNA2) #0'
+    instruction = ir.substitute(ir.Load('%A_4', 'double', ir.Pointer('double', '%arg', 8)), values)
+    assert instruction.to_ll() == '%A_4 = load double, double* %X_0, align 8'
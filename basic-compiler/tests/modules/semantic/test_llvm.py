@@ -5,3 +5,12 @@ def test_dimensions_specifier():
     assert llvm.dimensions_specifier([]) == 'double'
     assert llvm.dimensions_specifier([2]) == '[2 x double]'
     assert llvm.dimensions_specifier([2, 4]) == '[2 x [4 x double]]'
+
+
+def test_dim_bounds_are_inclusive():
+    generator = llvm.LlvmIrGenerator('test.bas')
+    generator.lvalue('A')
+    for bound in ('3', '10'):
+        generator.dim_dimension(bound)
+    generator.dim_end()
+    assert generator.state.variable_dimensions['A'] == [4, 11]
@@ -139,3 +139,31 @@ define dso_local i32 @main() local_unnamed_addr #1 {
 }
 declare void @exit(i32) local_unnamed_addr noreturn #0
 ''')
+
+
+def test_writes_to_output_stream():
+    with io.StringIO() as output, io.StringIO() as stdout:
+        with redirect_stdout(stdout):
+            syntax_recognizer = SyntaxRecognizer(None, output=output)
+            syntax_recognizer.handle_event(('open', 'source.bas'))
+            syntax_recognizer.handle_event(('eof', None))
+        assert not stdout.getvalue()
+        s = output.getvalue()
+    assert s == syntax_recognizer.ir_generator.to_ll() + '\n'
+    assert_source_matches(s, '''source_filename = "source.bas"
+target triple = "x86_64-pc-linux-gnu"
+; void @program(i8* %target_label) omitted because it's empty
+define dso_local i32 @main() local_unnamed_addr #1 {
+  ret i32 0
+}
+''')
+
+
+def test_grammar_is_shared_by_recognizers():
+    recognizers = [SyntaxRecognizer(None, output=io.StringIO()) for _ in range(2)]
+    for recognizer, name in zip(recognizers, ('a.bas', 'b.bas')):
+        recognizer.handle_event(('open', name))
+    assert recognizers[0].fsm.dispatch_tables is recognizers[1].fsm.dispatch_tables
+    for recognizer, name in zip(recognizers, ('a.bas', 'b.bas')):
+        recognizer.handle_event(('eof', None))
+        assert 'source_filename = "{}"'.format(name) in recognizer.output.getvalue()
@@ -0,0 +1,86 @@
+from contextlib import redirect_stdout
+import io
+from pathlib import Path
+from unittest.mock import call, MagicMock
+
+import pytest
+
+from basic_compiler.main import LEXERS
+from basic_compiler.modules.EventDrivenModule import EventDrivenModule
+from basic_compiler.modules.EventEngine import EventEngine
+from basic_compiler.modules.syntax_recognizer.SyntaxRecognizer import SyntaxRecognizer
+from basic_compiler.modules.tokenization.FileReader import FileReader
+
+base_dir = Path(__file__).resolve().parent
+
+
+class RecordingModule(EventDrivenModule):
+    def __init__(self, event_names):
+        self.event_names = event_names
+        self.batches = []
+        self.events = []
+        super().__init__()
+
+    def get_handlers(self):
+        return {x: lambda event, name=x: self.events.append((name, *event)) for x in self.event_names}
+
+    def handle_events(self, events):
+        self.batches.append(events)
+        super().handle_events(events)
+
+
+def test_routes_events_to_handling_modules():
+    a = RecordingModule(['a', 'shared'])
+    b = RecordingModule(['b', 'shared'])
+    engine = EventEngine([a, b])
+    engine.add_event(('a', 1))
+    engine.add_event(('shared', 2))
+    engine.add_event(('b', 3))
+    engine.add_event(('unknown', 4))
+    assert a.events == [('a', 1), ('shared', 2)]
+    assert b.events == [('shared', 2), ('b', 3)]
+
+
+def test_splits_batches_by_route():
+    a = RecordingModule(['a', 'a2', 'shared'])
+    b = RecordingModule(['b', 'shared'])
+    engine = EventEngine([a, b], batched=True)
+    engine.add_events([('a', 1), ('a2', 2), ('b', 3), ('shared', 4), ('a', 5)])
+    assert a.batches == [[('a', 1), ('a2', 2)], [('shared', 4)], [('a', 5)]]
+    assert b.batches == [[('b', 3)], [('shared', 4)]]
+
+
+def test_module_without_batched_engine_emits_single_events():
+    add_external_event = MagicMock()
+    module = RecordingModule([])
+    module.set_external_event_handler(add_external_event)
+    module.emit_events([('a', 1), ('b', 2)])
+    add_external_event.assert_has_calls([call(('a', 1)), call(('b', 2))])
+
+
+def compile_to_ir(source, lexer, batched):
+    engine = EventEngine([FileReader(), *LEXERS[lexer](), SyntaxRecognizer()], batched=batched)
+    with io.StringIO() as f:
+        with redirect_stdout(f):
+            engine.start(('open', source))
+        return f.getvalue()
+
+
+@pytest.mark.parametrize('lexer', LEXERS)
+@pytest.mark.parametrize('source', sorted((base_dir / 'semantic').glob('*.bas')), ids=lambda x: x.name)
+def test_batched_engine_generates_same_ir(source, lexer):
+    assert compile_to_ir(source, lexer, batched=True) == compile_to_ir(source, 'fsm', batched=False)
+
+
+@pytest.mark.parametrize('program,column', [('10 LET Y = X +* 2\n', 15), ('10 PRINT X ? 2\n', 12)])
+def test_batched_engine_reports_error_position(program, column, tmp_path, capsys):
+    source = tmp_path / 'error.bas'
+    source.write_text(program)
+    reports = []
+    for batched in (False, True):
+        with pytest.raises(Exception):
+            compile_to_ir(source, 'fsm', batched)
+        reports.append(capsys.readouterr().err)
+    assert reports[0] == reports[1]
+    # Tokens are recognized at the character following them
+    assert reports[1].endswith('AsciiCategorizer: {}{}^\n'.format(program, ' ' * (18 + column)))
@@ -2,12 +2,22 @@ from pathlib import Path
 
 from unittest.mock import call, MagicMock
 
+import pytest
+
+from basic_compiler import main
+from basic_compiler.fsm import FsmError
 from basic_compiler.modules.EventEngine import EventEngine
 from basic_compiler.modules.tokenization.AsciiCategorizer import AsciiCategorizer
 from basic_compiler.modules.tokenization.FileReader import FileReader
 from basic_compiler.modules.tokenization.Tokenizer import Tokenizer
 
 base_dir = Path(__file__).resolve().parent
+sources = [
+    base_dir / 'source.bas',
+    base_dir / 'small_source.bas',
+    *sorted((base_dir.parent / 'semantic').glob('*.bas')),
+    *sorted((base_dir.parents[2].parent / 'sample-programs').glob('*.bas')),
+]
 
 
 def test_lexer_end_to_end():
@@ -45,3 +55,62 @@ def test_lexer_end_to_end():
         call(('number', '2')),
         call(('end_of_line', '\n')),
     ])
+
+
+def fsm_tokens(lines):
+    add_external_event = MagicMock()
+    tokenizer = Tokenizer(add_external_event)
+    categorizer = AsciiCategorizer(tokenizer.handle_event)
+    for line in lines:
+        categorizer.handle_event(('ascii_line', line))
+    tokenizer.handle_event(('eof', None))
+    return add_external_event.call_args_list
+
+
+def lexer_tokens(lexer, lines):
+    add_external_event = MagicMock()
+    modules = main.LEXERS[lexer]()
+    for source, sink in zip(modules, modules[1:]):
+        source.set_external_event_handler(sink.handle_event)
+    modules[-1].set_external_event_handler(add_external_event)
+    for line in lines:
+        modules[0].handle_event(('ascii_line', line))
+    modules[-1].handle_event(('eof', None))
+    return add_external_event.call_args_list
+
+
+@pytest.mark.parametrize('lexer', main.LEXERS)
+@pytest.mark.parametrize('lines', [
+    ['1 IF S(P) = 0 THEN GOTO 3\n'],
+    ['1 IF S2(P) <= -5 THEN GOTO 3\n'],
+    ['-1.23E-4\n'],
+    ['-1.2.3E-4.5E6\n'],
+    ['A\n', 'X1\n', 'GO\n', 'GOTO\n'],
+    ['"String 0 X1 y14"\n'],
+    ['"String with ""escaped double quote"""\n'],
+    ['10\n', '-20\n', '30\n', '3.14E-0\n', '-.5\n'],
+    ['10 rem lower case remark\n', '20 REMARKABLE\n', '30 END'],
+    ['40 IF A <> B THEN 10\n', '50 IF A >= B THEN 10\n'],
+])
+def test_same_tokens_as_fsm(lines, lexer):
+    assert lexer_tokens(lexer, lines) == fsm_tokens(lines)
+
+
+@pytest.mark.parametrize('lexer', main.LEXERS)
+@pytest.mark.parametrize('source', sources, ids=lambda x: x.name)
+def test_same_tokens_as_fsm_on_sources(source, lexer):
+    with open(source) as f:
+        lines = f.readlines()
+    assert lexer_tokens(lexer, lines) == fsm_tokens(lines)
+
+
+@pytest.mark.parametrize('lexer', main.LEXERS)
+@pytest.mark.parametrize('lines', [
+    ['XY0\n'],
+    ['"""\n'],
+    ['"\n', '"\n'],
+    ['1.5E\n'],
+])
+@pytest.mark.xfail(raises=FsmError)
+def test_invalid_tokens(lines, lexer):
+    lexer_tokens(lexer, lines)
@@ -0,0 +1,52 @@
+import os
+
+from basic_compiler.cache import cache_key, CompilationCache, TOKEN_CACHE_DIR
+
+
+def test_key_depends_on_source_and_flags(tmp_path):
+    source = tmp_path / 'a.bas'
+    source.write_text('10 PRINT 1\n')
+    key = cache_key(source, {'opt': False, 'bin': False})
+    assert key == cache_key(source, {'bin': False, 'opt': False})
+    assert key != cache_key(source, {'opt': True, 'bin': False})
+    source.write_text('10 PRINT 2\n')
+    assert key != cache_key(source, {'opt': False, 'bin': False})
+
+
+def test_store_and_restore(tmp_path):
+    cache = CompilationCache(tmp_path / 'cache')
+    output = tmp_path / 'a.ll'
+    assert not cache.restore('key', {'ir.ll': output})
+    output.write_text('IR')
+    cache.store('key', {'ir.ll': output})
+    output.unlink()
+    assert cache.restore('key', {'ir.ll': output})
+    assert output.read_text() == 'IR'
+    # Entries missing an artifact are a miss
+    assert not cache.restore('key', {'ir.ll': output, 'bin': tmp_path / 'a'})
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = CompilationCache(tmp_path / 'cache', max_size=25)
+    output = tmp_path / 'a.ll'
+    output.write_text('x' * 10)
+    for i, key in enumerate(('first', 'second')):
+        cache.store(key, {'ir.ll': output})
+        os.utime(tmp_path / 'cache' / key, (i, i))
+    assert cache.restore('first', {'ir.ll': output})
+    cache.store('third', {'ir.ll': output})
+    assert sorted(x.name for x in (tmp_path / 'cache').iterdir()) == ['first', 'third']
+
+
+def test_evicts_tokens(tmp_path):
+    cache = CompilationCache(tmp_path / 'cache', max_size=25)
+    token_dir = tmp_path / 'cache' / TOKEN_CACHE_DIR
+    token_dir.mkdir(parents=True)
+    for i, name in enumerate(('first', 'second')):
+        (token_dir / name).write_text('x' * 10)
+        os.utime(token_dir / name, (i, i))
+    output = tmp_path / 'a.ll'
+    output.write_text('x' * 10)
+    cache.store('key', {'ir.ll': output})
+    assert [x.name for x in token_dir.iterdir()] == ['second']
+    assert (tmp_path / 'cache' / 'key').is_dir()
@@ -0,0 +1,93 @@
+import itertools
+
+import pytest
+
+from basic_compiler.fsm import bind_actions, compile_state, find_compiled_transition, find_transition, Fsm, State, Transition
+from basic_compiler.modules.tokenization.Tokenizer import TRANSITION_TABLE
+
+
+@pytest.mark.parametrize('state_name', TRANSITION_TABLE.keys())
+def test_compiled_state_matches_linear_scan(state_name):
+    state = TRANSITION_TABLE[state_name]
+    dispatch_table = compile_state(state)
+    event_classes = ('ascii_character', 'ascii_digit', 'ascii_delimiter', 'ascii_ctrl', 'ascii_special', 'eof')
+    values = ('R', 'r', 'E', 'e', 'M', 'X', '0', ' ', '\n', '.', '"', '>', '<', '=', '+', '-', None)
+    for event in itertools.product(event_classes, values):
+        assert find_compiled_transition(dispatch_table, event) is find_transition(state.transitions, event)
+
+
+def test_fallback_shadows_later_transitions():
+    sub_fsm = Fsm({'start': State(True)})
+    state = State(None, [
+        Transition(('special', '+'), 'plus'),
+        Transition(None, 'empty'),
+        Transition('special', 'unreachable'),
+    ])
+    dispatch_table = compile_state(state)
+    assert find_compiled_transition(dispatch_table, ('special', '+')).to == 'plus'
+    assert find_compiled_transition(dispatch_table, ('special', '-')).to == 'empty'
+    state = State(None, [Transition(sub_fsm, 'sub'), Transition('number', 'unreachable')])
+    assert find_compiled_transition(compile_state(state), ('number', '1')).to == 'sub'
+
+
+def test_class_transition_shadows_later_value_transition():
+    state = State(None, [
+        Transition('special', 'any_special'),
+        Transition(('special', '+'), 'unreachable'),
+    ])
+    assert find_compiled_transition(compile_state(state), ('special', '+')).to == 'any_special'
+
+
+def test_reassigning_states_recompiles():
+    fsm = Fsm({})
+    fsm.states = {'start': State(None, [Transition('number', 'start')])}
+    fsm.transition(('number', '1'))
+    assert fsm.current_state_name == 'start'
+
+
+def test_nested_sub_fsm_calls_reuse_frames():
+    calls = []
+    parenthesized = Fsm({})
+    parenthesized.states = {
+        'start': State(None, [Transition(('special', '('), 'open')]),
+        'open': State(None, [
+            Transition('number', 'close'),
+            Transition(parenthesized, 'close', lambda: calls.append('nested')),
+        ]),
+        'close': State(None, [Transition(('special', ')'), 'end')]),
+        'end': State(True),
+    }
+    fsm = Fsm({
+        'start': State(None, [Transition(parenthesized, 'after', lambda: calls.append('outer'))]),
+        'after': State(None, [Transition('end_of_line', 'start')]),
+    })
+    for _ in range(2):
+        for event in [('special', '('), ('special', '('), ('number', '1'), ('special', ')'), ('special', ')'),
+                      ('end_of_line', '\n')]:
+            fsm.transition(event)
+        assert fsm.depth == 0
+        assert fsm.current_state_name == 'start'
+    assert calls == ['nested', 'outer'] * 2
+    assert len(fsm.frames) == 2
+
+
+def test_named_actions_are_bound_per_fsm():
+    class Target:
+        def __init__(self):
+            self.calls = []
+            self.nested = self
+
+        def number(self, value):
+            self.calls.append(value)
+
+    sub_fsm = Fsm({'start': State(None, [Transition('number', 'end', 'nested.number')]), 'end': State(True)})
+    states = {
+        'start': State(None, [Transition(sub_fsm, 'after', 'number')]),
+        'after': State(None, [Transition('end_of_line', 'start')]),
+    }
+    targets = [Target(), Target()]
+    fsms = [Fsm(states, actions=bind_actions(x, ['number', 'nested.number'])) for x in targets]
+    for fsm, value in zip(fsms, ('1', '2')):
+        fsm.transition(('number', value))
+        fsm.transition(('end_of_line', '\n'))
+    assert [x.calls for x in targets] == [['1', '\n'], ['2', '\n']]
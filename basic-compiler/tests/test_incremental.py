@@ -0,0 +1,76 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from basic_compiler import incremental, main
+
+base_dir = Path(__file__).resolve().parent
+sources = sorted((base_dir / 'modules' / 'semantic').glob('*.bas'))
+
+
+def incremental_ir(source, directory, lexer='fsm'):
+    with io.StringIO() as f:
+        incremental.to_ir(source, main.LEXERS[lexer], f, directory=directory)
+        return f.getvalue()
+
+
+@pytest.mark.parametrize('source', sources, ids=lambda x: x.name)
+def test_generates_same_ir(source, tmp_path):
+    assert incremental_ir(source, tmp_path) == main.compile_to_ir(source)
+    # Second compilation, from cached tokens
+    assert incremental_ir(source, tmp_path) == main.compile_to_ir(source)
+
+
+def test_tokenizes_changed_lines(tmp_path):
+    source = tmp_path / 'a.bas'
+    source.write_text('10 LET X = 1\n20 PRINT X\n\n30 END')
+    lines = source.read_text().splitlines(keepends=True)
+    cache = incremental.TokenCache.for_source(source, tmp_path / 'tokens')
+    tokens = cache.tokens(lines, main.LEXERS['fsm'])
+    assert tokens == [
+        [('number', '10'), ('identifier', 'LET'), ('variable', 'X'), ('special', '='), ('number', '1'),
+         ('end_of_line', '\n')],
+        [('number', '20'), ('identifier', 'PRINT'), ('variable', 'X'), ('end_of_line', '\n')],
+        [('end_of_line', '\n')],
+        [('number', '30'), ('identifier', 'END')],
+    ]
+    assert cache.tokenized_lines == 4
+    cache.save()
+
+    lines[1] = '20 PRINT X, X\n'
+    lines[3] = '30 END\n'
+    cache = incremental.TokenCache.for_source(source, tmp_path / 'tokens')
+    assert cache.tokens(lines, main.LEXERS['fsm'])[1:] == [
+        [('number', '20'), ('identifier', 'PRINT'), ('variable', 'X'), ('special', ','), ('variable', 'X'),
+         ('end_of_line', '\n')],
+        [('end_of_line', '\n')],
+        [('number', '30'), ('identifier', 'END'), ('end_of_line', '\n')],
+    ]
+    # The unnumbered line is always tokenized
+    assert cache.tokenized_lines == 3
+
+
+def test_changed_program(tmp_path):
+    source = tmp_path / 'a.bas'
+    source.write_text((base_dir / 'modules' / 'semantic' / 'for.bas').read_text())
+    incremental_ir(source, tmp_path / 'tokens')
+    source.write_text(source.read_text().replace('PRINT', 'PRINT 2 *'))
+    assert incremental_ir(source, tmp_path / 'tokens') == main.compile_to_ir(source)
+
+
+def test_discards_tokens_of_other_compiler_versions(tmp_path, monkeypatch):
+    source = tmp_path / 'a.bas'
+    source.write_text('10 END\n')
+    incremental_ir(source, tmp_path / 'tokens')
+    assert incremental.TokenCache.for_source(source, tmp_path / 'tokens').lines
+    monkeypatch.setattr(incremental, 'compiler_hash', lambda: 'other')
+    assert not incremental.TokenCache.for_source(source, tmp_path / 'tokens').lines
+
+
+def test_discards_tokens_of_programs_that_fail(tmp_path):
+    source = tmp_path / 'a.bas'
+    source.write_text('10 LET = 1\n')
+    with pytest.raises(Exception):
+        incremental_ir(source, tmp_path / 'tokens')
+    assert not list((tmp_path / 'tokens').glob('*'))
@@ -0,0 +1,108 @@
+from pathlib import Path
+import shutil
+
+import pytest
+
+from basic_compiler import incremental, main
+from basic_compiler.cache import TOKEN_CACHE_DIR
+
+base_dir = Path(__file__).resolve().parent
+sources = sorted((base_dir / 'modules' / 'semantic').glob('*.bas'))
+
+
+@pytest.mark.parametrize('lexer', main.LEXERS)
+@pytest.mark.parametrize('source', sources, ids=lambda x: x.name)
+def test_streaming_pipeline_generates_same_ir(source, lexer):
+    assert main.compile_to_ir(source, lexer, 'stream') == main.compile_to_ir(source, 'fsm', 'events')
+
+
+def test_expand_sources(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    for name in ('a.bas', 'b.bas', 'sub/c.bas', 'notes.txt'):
+        (tmp_path / name).touch()
+    assert main.expand_sources([str(tmp_path)]) == [tmp_path / 'a.bas', tmp_path / 'b.bas', tmp_path / 'sub' / 'c.bas']
+    assert main.expand_sources([str(tmp_path / '*.bas'), str(tmp_path / 'a.bas')]) == [tmp_path / 'a.bas', tmp_path / 'b.bas']
+    with pytest.raises(RuntimeError):
+        main.expand_sources([str(tmp_path / 'missing.bas')])
+
+
+def test_compile_batch(tmp_path, capsys):
+    for source in sources[:4]:
+        (tmp_path / source.name).write_text(source.read_text())
+    (tmp_path / 'invalid.bas').write_text('10 LET = 1\n')
+    args = main.parse_args(['--jobs', '2', '--no-cache', str(tmp_path)])
+    assert main.compile_batch(main.expand_sources(args.sources), args) == 1
+    assert '4 compiled, 1 failed' in capsys.readouterr().out
+    for source in sources[:4]:
+        assert (tmp_path / '{}.ll'.format(source.stem)).read_text() == main.compile_to_ir(source)
+
+
+def test_binary_paths(tmp_path):
+    sources = [tmp_path / 'a.bas', tmp_path / 'x' / 'a.bas', tmp_path / 'x' / 'y' / 'b.bas']
+    assert main.binary_paths(sources, 'bin') == {
+        sources[0]: Path('bin') / 'a',
+        sources[1]: Path('bin') / 'x' / 'a',
+        sources[2]: Path('bin') / 'x' / 'y' / 'b',
+    }
+    assert main.binary_paths(sources[1:], 'bin') == {sources[1]: Path('bin') / 'a', sources[2]: Path('bin') / 'y' / 'b'}
+
+
+def test_compile_batch_binaries_of_sources_with_same_name(tmp_path, monkeypatch):
+    for name in ('src/a.bas', 'src/sub/a.bas'):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text('10 PRINT 1\n')
+    monkeypatch.setattr(main.toolchain, 'link', lambda write_ir, path: Path(path).write_text(str(path)))
+    args = main.parse_args(['--no-cache', '--bin', str(tmp_path / 'bin'), str(tmp_path / 'src')])
+    assert main.compile_batch(main.expand_sources(args.sources), args) == 0
+    assert sorted(str(x.relative_to(tmp_path / 'bin')) for x in (tmp_path / 'bin').rglob('*') if x.is_file()) == \
+        ['a', 'sub/a']
+
+
+def test_cached_compilation(tmp_path, monkeypatch):
+    source = tmp_path / sources[0].name
+    source.write_text(sources[0].read_text())
+    args = main.parse_args(['--cache-dir', str(tmp_path / 'cache'), str(source)])
+    main.main(args)
+    ir = (tmp_path / '{}.ll'.format(source.stem)).read_text()
+    (tmp_path / '{}.ll'.format(source.stem)).unlink()
+
+    def fail(*args):
+        raise AssertionError('IR generated on cache hit')
+    monkeypatch.setattr(main, 'generate_ir', fail)
+    main.main(args)
+    assert (tmp_path / '{}.ll'.format(source.stem)).read_text() == ir
+
+
+def test_failed_compilation_keeps_previous_ir(tmp_path):
+    source = tmp_path / 'a.bas'
+    source.write_text('10 PRINT 1\n')
+    args = main.parse_args(['--no-cache', str(source)])
+    main.main(args)
+    ir = (tmp_path / 'a.ll').read_text()
+    source.write_text('10 LET = 1\n')
+    with pytest.raises(Exception):
+        main.main(args)
+    assert (tmp_path / 'a.ll').read_text() == ir
+    assert sorted(x.name for x in tmp_path.iterdir()) == ['a.bas', 'a.ll']
+
+
+def test_incremental_pipeline_keeps_tokens_in_cache_dir(tmp_path, monkeypatch):
+    source = tmp_path / 'a.bas'
+    source.write_text('10 PRINT 1\n')
+    with monkeypatch.context() as m:
+        def fail(*args):
+            raise AssertionError('Token cache used with --no-cache')
+        m.setattr(incremental.TokenCache, 'for_source', fail)
+        main.main(main.parse_args(['--pipeline', 'incremental', '--no-cache', str(source)]))
+    assert sorted(x.name for x in tmp_path.iterdir()) == ['a.bas', 'a.ll']
+    main.main(main.parse_args(['--pipeline', 'incremental', '--cache-dir', str(tmp_path / 'cache'), str(source)]))
+    assert len(list((tmp_path / 'cache' / TOKEN_CACHE_DIR).iterdir())) == 1
+
+
+@pytest.mark.skipif(not shutil.which('lli'), reason='LLVM interpreter lli not found')
+def test_lli_without_intermediate_files(tmp_path, capfd):
+    source = tmp_path / 'for.bas'
+    source.write_text((base_dir / 'modules' / 'semantic' / 'for.bas').read_text())
+    main.main(main.parse_args(['--no-cache', '--lli', str(source)]))
+    assert capfd.readouterr().out == ''.join('{0:.6f}\n'.format(x) for x in range(11))
+    assert list(tmp_path.iterdir()) == [source]
@@ -0,0 +1,66 @@
+import os
+from pathlib import Path
+import threading
+
+import pytest
+
+from basic_compiler import main, server
+from basic_compiler.modules.semantic.options import CodegenOptions
+
+base_dir = Path(__file__).resolve().parent
+source = base_dir / 'modules' / 'semantic' / 'for.bas'
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    path = tmp_path / 'compiler.sock'
+    with server.make_server(path) as compile_server:
+        thread = threading.Thread(target=compile_server.serve_forever)
+        thread.start()
+        yield path
+        compile_server.shutdown()
+        thread.join()
+
+
+def test_compiles_to_ir(socket_path):
+    response = server.send_request({'source': str(source)}, socket_path)
+    assert response == {'status': 0, 'ir': main.compile_to_ir(source), 'output': ''}
+    response = server.send_request({'source': source.name, 'cwd': str(source.parent), 'lexer': 'dfa',
+                                    'options': {'promote_variables': True}}, socket_path)
+    assert response['ir'] == main.compile_to_ir(source, options=CodegenOptions(promote_variables=True))
+
+
+def test_runs_command_line_compiler(socket_path, tmp_path):
+    program = tmp_path / 'a.bas'
+    program.write_text(source.read_text())
+    response = server.send_request({'argv': ['--no-cache', 'a.bas'], 'cwd': str(tmp_path)}, socket_path)
+    assert response == {'status': 0, 'output': ''}
+    assert (tmp_path / 'a.ll').read_text() == main.compile_to_ir(program)
+
+
+def test_reports_errors(socket_path, tmp_path):
+    program = tmp_path / 'a.bas'
+    program.write_text('10 LET = 1\n')
+    response = server.send_request({'source': str(program)}, socket_path)
+    assert response['status'] == 1
+    assert 'Line 1: 10 LET = 1' in response['output']
+    response = server.send_request({'argv': ['--lexer', 'none', str(program)]}, socket_path)
+    assert response['status'] == 2
+    assert 'invalid choice' in response['output']
+    assert server.send_request({}, socket_path)['status'] == 1
+    # The server keeps handling requests after errors
+    assert server.send_request({'source': str(source)}, socket_path)['status'] == 0
+
+
+def test_reports_toolchain_errors(socket_path, tmp_path, monkeypatch):
+    program = tmp_path / 'a.bas'
+    program.write_text(source.read_text())
+    # clang replaced by a script that fails with a diagnostic
+    clang = tmp_path / 'clang'
+    clang.write_text('#!/bin/sh\ncat > /dev/null\necho "error: invalid IR" >&2\nexit 1\n')
+    clang.chmod(0o755)
+    monkeypatch.setenv('PATH', '{}:{}'.format(tmp_path, os.environ['PATH']))
+    response = server.send_request({'argv': ['--no-cache', '--bin', 'a', 'a.bas'], 'cwd': str(tmp_path)},
+                                   socket_path)
+    assert response['status'] == 1
+    assert 'error: invalid IR\n' in response['output']
@@ -0,0 +1,35 @@
+import subprocess
+
+import pytest
+
+from basic_compiler import toolchain
+
+
+def test_run_pipes_input():
+    assert toolchain.run(['cat'], toolchain.text_writer('IR text'), capture_output=True) == 'IR text'
+
+
+def test_file_writer(tmp_path):
+    path = tmp_path / 'a.ll'
+    path.write_text('IR file')
+    assert toolchain.run(['cat'], toolchain.file_writer(path), capture_output=True) == 'IR file'
+
+
+def test_run_raises_on_failure():
+    with pytest.raises(subprocess.CalledProcessError):
+        toolchain.run(['sh', '-c', 'cat > /dev/null; exit 3'], toolchain.text_writer('IR'))
+
+
+def test_run_writes_errors_to_stderr(capsys):
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        toolchain.run(['sh', '-c', 'cat > /dev/null; echo "error: invalid IR" >&2; exit 1'],
+                      toolchain.text_writer('IR'))
+    assert e.value.stderr == 'error: invalid IR\n'
+    assert capsys.readouterr().err == 'error: invalid IR\n'
+
+
+def test_run_kills_process_if_writer_fails():
+    def fail(output):
+        raise RuntimeError('IR generation failed')
+    with pytest.raises(RuntimeError):
+        toolchain.run(['cat'], fail, capture_output=True)